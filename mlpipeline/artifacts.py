@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import os
+import tempfile
+
+from .yamlio import dump_yaml_str
+
+# Read the umask once to give the new files the default permissions,
+# os.umask can't be read without being set
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def write_file(path: str, content: str | bytes, verbose: bool = True) -> bool:
+    """Write a file only if its content changed, the file is replaced
+    atomically so it is never seen half written
+
+    Parameters
+    ----------
+    path: str
+        path of the file
+    content: str | bytes
+        new content of the file
+    verbose: bool
+        print the path of the file when it is updated
+    """
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    # Keep the file untouched (and its mtime) if the content is the same
+    try:
+        with open(path, "rb") as f:
+            if f.read() == content:
+                return False
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(
+        dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if verbose:
+        print(f"Updated {path}")
+    return True
+
+
+def dump_yaml(path: str, data: object, **kwargs) -> bool:
+    """Serialize the data in yaml and write it only if the file changed
+
+    Parameters
+    ----------
+    path: str
+        path of the yaml file
+    data: object
+        data to serialize
+    **kwargs:
+        options of yaml.dump
+    """
+
+    return write_file(path, dump_yaml_str(data, **kwargs))
+
+
+def copy_file(src: str, dst: str) -> bool:
+    """Copy a file only if the destination content is different
+
+    Parameters
+    ----------
+    src: str
+        path of the source file
+    dst: str
+        path of the destination file
+    """
+
+    with open(src, "rb") as f:
+        return write_file(dst, f.read())
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Size of the chunks copied by the kernel or read and written by python
+CHUNK_SIZE = 1024 * 1024
+# Errors of the fast paths meaning the files can't be copied by the kernel,
+# the copy falls back to the next way of copying them
+FALLBACK_ERRORS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+
+class CopyStats:
+    """Class to measure the throughput of a bulk copy"""
+
+    def __init__(self, files: int, size: int, seconds: float):
+        self.files = files
+        self.size = size
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        # Avoid a division by zero on the copies faster than the clock
+        seconds = max(self.seconds, 1e-6)
+        return (
+            f"{self.files / seconds:.0f} files/s, "
+            f"{self.size / seconds / 1024 / 1024:.1f} MB/s"
+        )
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, copy: Callable) -> bool:
+    """Copy a file with a kernel copy function, returns False if the kernel
+    can't copy it and nothing was copied"""
+
+    copied = 0
+    while True:
+        try:
+            count = copy(src_fd, dst_fd, copied)
+        except OSError as e:
+            if copied or e.errno not in FALLBACK_ERRORS:
+                raise
+            return False
+        if not count:
+            return True
+        copied += count
+
+
+def copy_content(src: str, dst: str):
+    """Copy the content of a file with copy_file_range or sendfile when the
+    platform has them, the content is read and written by python otherwise
+
+    Parameters
+    ----------
+    src: str
+        path of the source file
+    dst: str
+        path of the destination file
+    """
+
+    with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+        src_fd, dst_fd = src_f.fileno(), dst_f.fileno()
+
+        if hasattr(os, "copy_file_range") and _kernel_copy(
+            src_fd,
+            dst_fd,
+            lambda src_fd, dst_fd, offset: os.copy_file_range(
+                src_fd, dst_fd, CHUNK_SIZE, offset, offset
+            ),
+        ):
+            return
+        if hasattr(os, "sendfile") and _kernel_copy(
+            src_fd,
+            dst_fd,
+            lambda src_fd, dst_fd, offset: os.sendfile(
+                dst_fd, src_fd, offset, CHUNK_SIZE
+            ),
+        ):
+            return
+        shutil.copyfileobj(src_f, dst_f, CHUNK_SIZE)
+
+
+def copy_file(src: str, dst: str) -> int:
+    """Copy a file with its permissions, the destination is replaced
+    atomically. Returns the size of the file
+
+    Parameters
+    ----------
+    src: str
+        path of the source file
+    dst: str
+        path of the destination file, its folder must exist
+    """
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(dst) or ".",
+        prefix=f".{os.path.basename(dst)}.",
+        suffix=".tmp",
+    )
+    os.close(fd)
+    try:
+        copy_content(src, tmp_path)
+        shutil.copymode(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.path.getsize(dst)
+
+
+def copy_files(
+    files: list[tuple],
+    copy: Callable = copy_file,
+    jobs: int = None,
+) -> tuple[list, CopyStats]:
+    """Copy files concurrently, the folders of the destinations are created
+    once before copying. Returns the results of the copies in the order of
+    the files and the throughput of the copy
+
+    Parameters
+    ----------
+    files: list[tuple]
+        source and destination paths of the files, followed by the other
+        arguments of the copy if any
+    copy: Callable
+        function copying a source to a destination and returning the number
+        of bytes copied, or a tuple starting with it
+    jobs: int
+        number of threads copying the files, the default of the thread pools
+        if None
+    """
+
+    start = time.perf_counter()
+    for folder in sorted({os.path.dirname(file[1]) for file in files}):
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    # The copies release the gil while waiting for the disk
+    if len(files) > 1 and jobs != 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(lambda file: copy(*file), files))
+    else:
+        results = [copy(*file) for file in files]
+
+    size = sum(
+        result[0] if isinstance(result, tuple) else result
+        for result in results
+    )
+    return results, CopyStats(len(files), size, time.perf_counter() - start)
+
+
+def copy_tree(src: str, dst: str, jobs: int = None) -> CopyStats:
+    """Copy a folder like shutil.copytree with the files copied concurrently
+
+    Parameters
+    ----------
+    src: str
+        path of the source folder
+    dst: str
+        path of the destination folder, it mustn't exist
+    jobs: int
+        number of threads copying the files
+    """
+
+    # Fail like shutil.copytree on a missing folder
+    if not os.path.isdir(src):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), src)
+
+    files: list[tuple[str, str]] = []
+    folders: list[tuple[str, str]] = []
+    for root, dirs, names in os.walk(src, followlinks=True):
+        folder = os.path.normpath(
+            os.path.join(dst, os.path.relpath(root, src))
+        )
+        # The empty folders are copied too
+        os.makedirs(folder)
+        folders.append((root, folder))
+        files.extend(
+            (os.path.join(root, name), os.path.join(folder, name))
+            for name in names
+        )
+
+    stats = copy_files(files, jobs=jobs)[1]
+
+    # The permissions of the folders are copied once they are filled
+    for root, folder in reversed(folders):
+        shutil.copystat(root, folder)
+    return stats
@@ -11,10 +11,13 @@ from .delete import *
 from .init import *
 from .link import *
 from .list import *
+from .package import *
+from .registry import registry_session
 from .run_cloud import *
 from .run_local import *
 from .set_github_token import *
 from .show import *
+from .status import *
 from .sync import *
 from .utils import *
 
@@ -41,8 +44,11 @@ load_env()
 
 
 @click.group(name="package")
-def cli():
-    pass
+@click.pass_context
+def cli(ctx: click.Context):
+    # The registry is loaded once by the command and its changes are written
+    # at once when the command ends
+    ctx.with_resource(registry_session())
 
 
 @click.command("init")
@@ -67,11 +73,46 @@ def __init():
     help="Sync all the pipelines",
     is_flag=True,
 )
+@click.option(
+    "--static",
+    "-s",
+    help="Read the notebook's cells statically instead of executing them",
+    is_flag=True,
+)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of processes used to read the notebooks, or of pipelines synced at the same time with --all",
+    type=click.IntRange(min=1),
+    default=1,
+)
+@click.option(
+    "--link-mode",
+    "-l",
+    help="How the data and dependencies are put in the pipeline packages, the files that can't be linked are copied",
+    type=click.Choice(["copy", "hardlink", "reflink", "symlink"]),
+    default="copy",
+)
+@click.option(
+    "--sparse",
+    help="Package only the data files the stages of the pipelines depend on",
+    is_flag=True,
+)
+@click.option(
+    "--prune-deps",
+    help="Package only the modules of the folder dependencies the notebooks import",
+    is_flag=True,
+)
 def __sync(
     notebooks: str | None,
     pipeline: str | None,
     force: bool | None,
     all: bool | None,
+    static: bool | None,
+    jobs: int | None,
+    link_mode: str | None,
+    sparse: bool | None,
+    prune_deps: bool | None,
 ):
     """Sync the notebooks with the pipeline project or the main project
 
@@ -80,9 +121,100 @@ def __sync(
         (optional) pipeline (str | None): name of the pipeline
         (optional) force (bool | None): forces creation of a new params.yaml file (default: False)
         (optional) all (bool | None): sync all the pipelines (default: False)
+        (optional) static (bool | None): read the notebook's cells statically instead of executing them (default: False)
+        (optional) jobs (int | None): number of processes used to read the notebooks (default: 1)
+        (optional) link_mode (str | None): how the data and dependencies are put in the packages (default: copy)
+        (optional) sparse (bool | None): package only the data files the stages depend on (default: False)
+        (optional) prune_deps (bool | None): package only the modules of the folder dependencies the notebooks import (default: False)
+    """
+
+    sync(
+        notebooks,
+        pipeline,
+        force,
+        all,
+        static,
+        jobs,
+        link_mode=link_mode,
+        sparse=sparse,
+        prune_deps=prune_deps,
+    )
+
+
+@click.command("package")
+@click.option("--pipeline", "-p", help="Name of the pipeline", required=True)
+@click.option(
+    "--archive",
+    "-a",
+    help="Path of the archive, its extension selects the codec: .tar.zst, .tar.gz, .tar.bz2, .tar.xz or .tar",
+    required=True,
+)
+@click.option(
+    "--codec",
+    "-c",
+    type=click.Choice(["zst", "gz", "bz2", "xz", "none"]),
+    help="Compression codec of the archive",
+)
+@click.option(
+    "--level",
+    type=click.IntRange(min=0),
+    help="Compression level of the codec",
+)
+@click.option(
+    "--threads",
+    "-T",
+    type=click.IntRange(min=0),
+    help="Number of threads compressing the archive with zst (default: all the cores)",
+)
+@click.option(
+    "--static",
+    "-s",
+    help="Read the notebook's cells statically instead of executing them",
+    is_flag=True,
+)
+@click.option(
+    "--sparse",
+    help="Package only the data files the stages of the pipeline depend on",
+    is_flag=True,
+)
+@click.option(
+    "--prune-deps",
+    help="Package only the modules of the folder dependencies the notebooks import",
+    is_flag=True,
+)
+def __package(
+    pipeline: str,
+    archive: str,
+    codec: str | None,
+    level: int | None,
+    threads: int | None,
+    static: bool | None,
+    sparse: bool | None,
+    prune_deps: bool | None,
+):
+    """Package a pipeline in a compressed archive without syncing it
+
+    Param
+        pipeline (str): name of the pipeline
+        archive (str): path of the archive
+        (optional) codec (str | None): compression codec (default: from the extension of the archive)
+        (optional) level (int | None): compression level (default: the default of the codec)
+        (optional) threads (int | None): number of threads compressing the archive with zst (default: all the cores)
+        (optional) static (bool | None): read the notebook's cells statically instead of executing them (default: False)
+        (optional) sparse (bool | None): package only the data files the stages depend on (default: False)
+        (optional) prune_deps (bool | None): package only the modules of the folder dependencies the notebooks import (default: False)
     """
 
-    sync(notebooks, pipeline, force, all)
+    package(
+        pipeline,
+        archive,
+        codec,
+        level,
+        threads,
+        bool(static),
+        sparse=bool(sparse),
+        prune_deps=bool(prune_deps),
+    )
 
 
 @click.command("delete")
@@ -141,22 +273,55 @@ def __link(notebooks: str, pipeline: str):
 
 @click.command("show")
 @click.option("--pipeline", "-p", help="Name of the pipeline", required=False)
-def __show(pipeline: str):
+@click.option(
+    "--target",
+    "-t",
+    help="Stage to show with the stages it depends on",
+    required=False,
+)
+@click.option(
+    "--format",
+    "-f",
+    type=click.Choice(["ascii", "mermaid", "dot"]),
+    default="ascii",
+    help="Format of the graph",
+)
+def __show(pipeline: str, target: str, format: str):
     """Show the pipeline graph in the terminal"""
 
-    show(pipeline)
+    show(pipeline, target, format)
+
+
+@click.command("status")
+@click.option("--pipeline", "-p", help="Name of the pipeline", required=False)
+def __status(pipeline: str):
+    """Show the stages that changed since they were last run
+
+    Param
+        (optional) pipeline (str): name of the pipeline
+    """
+
+    status(pipeline)
 
 
 @click.command("run_local")
 @click.option("--pipeline", "-p", help="Name of the pipeline", required=False)
-def __run_local(pipeline: str):
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of data files pulled at the same time",
+    type=click.IntRange(min=1),
+    default=DEFAULT_PULL_JOBS,
+)
+def __run_local(pipeline: str, jobs: int):
     """Run the dvc pipeline on the main project or on the selected pipeline
 
     Param
         (optional) pipeline (str): name of the pipeline
+        (optional) jobs (int): number of data files pulled at the same time (default: 4)
     """
 
-    run_local(pipeline)
+    run_local(pipeline, jobs)
 
 
 @click.command("default")
@@ -206,7 +371,9 @@ def __set_github_token(token: str):
 
 cli.add_command(__init)
 cli.add_command(__sync)
+cli.add_command(__package)
 cli.add_command(__show)
+cli.add_command(__status)
 cli.add_command(__delete)
 cli.add_command(__create)
 cli.add_command(__link)
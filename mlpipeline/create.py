@@ -1,9 +1,10 @@
-import json
 import os
 import pathlib
 
-from .globals import DEFAULT_PIPELINE, PIPELINES_FOLDER
+from .globals import PIPELINES_FOLDER
 from .link import link_notebooks_to_pipeline
+from .locks import pipeline_lock
+from .registry import get_session
 
 
 def create_pipeline(pipeline: str):
@@ -19,26 +20,16 @@ def create_pipeline(pipeline: str):
         return
 
     # Create the directory if it does not exist
-    if pathlib.Path(os.path.join(PIPELINES_FOLDER, pipeline)).exists():
-        print(f"Pipeline {pipeline} already exists")
-        return
-
-    os.makedirs(os.path.join(PIPELINES_FOLDER, pipeline))
-
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    # Create the params.json file with the pipeline name as key and empty string as value
-    # and set the pipeline to the default one in the pipelines.json file
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
+    with pipeline_lock(pipeline):
+        if pathlib.Path(os.path.join(PIPELINES_FOLDER, pipeline)).exists():
+            print(f"Pipeline {pipeline} already exists")
+            return
 
-        pipelines[pipeline] = ""
-        pipelines[DEFAULT_PIPELINE] = pipeline
-    else:
-        pipelines = {pipeline: "", DEFAULT_PIPELINE: pipeline}
+        os.makedirs(os.path.join(PIPELINES_FOLDER, pipeline))
 
-    with open(pipelines_path, "w") as pipelines_f:
-        json.dump(pipelines, pipelines_f)
+    # Add the pipeline without notebooks to the registry and set it as the
+    # default pipeline
+    get_session().add_pipeline(pipeline, default=True)
 
     print(f"Pipeline {pipeline} created")
 
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import os
+import pathlib
+
+from .yamlio import load_yaml
+
+# Height of the boxes drawn in the ascii graph
+BOX_HEIGHT = 3
+# Space between two boxes of the same level
+BOX_SPACING = 2
+
+
+def _entry_paths(entries: list) -> list[str]:
+    """Get the paths of the deps or outs of a stage, each entry is either
+    the path or a dict with the path as its only key and the options
+
+    Parameters
+    ----------
+    entries: list
+        deps or outs of the stage
+    """
+
+    paths: list = []
+    for entry in entries or []:
+        if isinstance(entry, dict):
+            paths.extend(entry.keys())
+        else:
+            paths.append(entry)
+    return [str(path) for path in paths]
+
+
+def _join(wdir: str, path: str) -> str:
+    """Get the path relative to the project folder of a path relative
+    to the working directory of a stage"""
+
+    return os.path.normpath(os.path.join(wdir, path)).replace(os.sep, "/")
+
+
+class Dag:
+    """Class to model the graph of the stages of a dvc project, the edges
+    go from the stage producing an output to the stages depending on it"""
+
+    def __init__(self):
+        # Nodes in the order they were added with their deps and outs
+        self.nodes = {}
+        self.edges = {}
+
+    def add_node(self, name: str, deps: list[str], outs: list[str]):
+        """Add a stage to the graph
+
+        Parameters
+        ----------
+        name: str
+            name of the stage
+        deps: list[str]
+            dependencies of the stage relative to the project folder
+        outs: list[str]
+            outputs of the stage relative to the project folder
+        """
+
+        self.nodes[name] = {"deps": deps, "outs": outs}
+        self.edges[name] = []
+
+    def link_nodes(self):
+        """Add an edge between each output and the stages depending on it,
+        a dependency on a folder depends on the outputs inside it and the
+        other way around"""
+
+        # Index the outputs and the folders containing them
+        order = {name: i for i, name in enumerate(self.nodes)}
+        producers = {}
+        parents = {}
+        for name, node in self.nodes.items():
+            for out in node["outs"]:
+                producers.setdefault(out, set()).add(name)
+                parent = os.path.dirname(out)
+                while parent:
+                    parents.setdefault(parent, set()).add(name)
+                    parent = os.path.dirname(parent)
+
+        for name, node in self.nodes.items():
+            sources = set()
+            for dep in node["deps"]:
+                # The dependency is an output or inside an output folder
+                path = dep
+                while path:
+                    sources |= producers.get(path, set())
+                    path = os.path.dirname(path)
+                # The dependency is a folder containing outputs
+                sources |= parents.get(dep, set())
+
+            sources.discard(name)
+            for source in sorted(sources, key=order.get):
+                self.edges[source].append(name)
+
+    def predecessors(self) -> dict[str, list[str]]:
+        """Get the stages each stage depends on"""
+
+        predecessors: dict[str, list[str]] = {name: [] for name in self.nodes}
+        for source, targets in self.edges.items():
+            for target in targets:
+                predecessors[target].append(source)
+        return predecessors
+
+    def levels(self) -> dict[str, int]:
+        """Get the topological level of each stage, the stages without
+        dependencies are on level 0 and each stage is one level below the
+        deepest stage it depends on"""
+
+        predecessors = self.predecessors()
+        remaining = {name: len(preds) for name, preds in predecessors.items()}
+        levels: dict[str, int] = {}
+
+        # Kahn's algorithm, the stages are visited in the order of the file
+        ready = [name for name, count in remaining.items() if count == 0]
+        while ready:
+            name = ready.pop(0)
+            levels[name] = max(
+                (levels[pred] + 1 for pred in predecessors[name]), default=0
+            )
+            for target in self.edges[name]:
+                remaining[target] -= 1
+                if remaining[target] == 0:
+                    ready.append(target)
+
+        if len(levels) != len(self.nodes):
+            cycle = [name for name in self.nodes if name not in levels]
+            raise ValueError(f"Cycle found between the stages: {cycle}")
+
+        return levels
+
+    def subgraph(self, target: str) -> Dag:
+        """Get the graph of the target stage and the stages it depends on
+
+        Parameters
+        ----------
+        target: str
+            name of the stage
+        """
+
+        if target not in self.nodes:
+            raise KeyError(target)
+
+        predecessors = self.predecessors()
+        selected = {target}
+        stack = [target]
+        while stack:
+            for pred in predecessors[stack.pop()]:
+                if pred not in selected:
+                    selected.add(pred)
+                    stack.append(pred)
+
+        dag = Dag()
+        for name, node in self.nodes.items():
+            if name in selected:
+                dag.add_node(name, node["deps"], node["outs"])
+                dag.edges[name] = [
+                    t for t in self.edges[name] if t in selected
+                ]
+        return dag
+
+
+def find_dvc_files(folder: str) -> list[str]:
+    """Find the .dvc files of the project, the hidden folders and the
+    nested dvc projects (the pipelines) are skipped
+
+    Parameters
+    ----------
+    folder: str
+        folder of the project
+    """
+
+    dvc_files = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(
+            d
+            for d in dirs
+            if not d.startswith(".")
+            and not os.path.isdir(os.path.join(root, d, ".dvc"))
+        )
+        for file in sorted(files):
+            if file.endswith(".dvc"):
+                dvc_files.append(os.path.join(root, file))
+    return dvc_files
+
+
+def load_dag(folder: str = ".") -> Dag:
+    """Build the graph of the stages of the dvc.yaml file and of the .dvc
+    files of a project
+
+    Parameters
+    ----------
+    folder: str
+        folder of the project
+    """
+
+    dag = Dag()
+
+    # The .dvc files (imports and tracked data) are stages without command
+    for dvc_file in find_dvc_files(folder):
+        data = load_yaml(dvc_file) or {}
+
+        name = os.path.relpath(dvc_file, folder).replace(os.sep, "/")
+        wdir = _join(os.path.dirname(name), data.get("wdir", "."))
+        dag.add_node(
+            name,
+            [],
+            [
+                _join(wdir, out["path"])
+                for out in data.get("outs", [])
+                if isinstance(out, dict) and "path" in out
+            ],
+        )
+
+    dvc_yaml = pathlib.Path(folder) / "dvc.yaml"
+    if dvc_yaml.exists():
+        data = load_yaml(str(dvc_yaml)) or {}
+
+        for name, stage in (data.get("stages") or {}).items():
+            wdir = stage.get("wdir", ".")
+            dag.add_node(
+                name,
+                [_join(wdir, dep) for dep in _entry_paths(stage.get("deps"))],
+                [_join(wdir, out) for out in _entry_paths(stage.get("outs"))],
+            )
+
+    dag.link_nodes()
+    return dag
+
+
+def _split_edges(dag: Dag, levels: dict[str, int]) -> tuple[list, list]:
+    """Split the edges spanning several levels with a vertical line on each
+    level they cross, a vertical line is a tuple (source, level) shared by
+    all the edges of the source crossing the level. Returns the nodes of
+    each level and the links between the nodes of consecutive levels"""
+
+    rows: list[list] = [[] for _ in range(max(levels.values()) + 1)]
+    for name in dag.nodes:
+        rows[levels[name]].append(name)
+
+    links = []
+    for source, targets in dag.edges.items():
+        deepest = max((levels[target] for target in targets), default=0)
+        previous: str | tuple = source
+        for level in range(levels[source] + 1, deepest):
+            vertical = (source, level)
+            rows[level].append(vertical)
+            links.append((previous, vertical))
+            previous = vertical
+        for target in targets:
+            if levels[target] == levels[source] + 1:
+                links.append((source, target))
+            else:
+                links.append(((source, levels[target] - 1), target))
+    return rows, links
+
+
+def _order_rows(rows: list[list], links: list):
+    """Order each level by the mean position of the nodes above it"""
+
+    parents: dict[str | tuple, list] = {}
+    for source, target in links:
+        parents.setdefault(target, []).append(source)
+
+    for level in range(1, len(rows)):
+        position = {node: i for i, node in enumerate(rows[level - 1])}
+        rows[level].sort(
+            key=lambda node: sum(position[p] for p in parents.get(node, []))
+            / max(len(parents.get(node, [])), 1)
+        )
+
+
+def _node_width(node: str | tuple) -> int:
+    """Width of the box of a stage, or of a vertical line"""
+
+    # Odd widths keep the centers of the stacked boxes aligned
+    return 1 if isinstance(node, tuple) else (len(node) + 4) | 1
+
+
+def _layout_rows(rows: list[list]) -> tuple[int, dict, dict]:
+    """Center the levels on the widest one. Returns the width of the graph,
+    the left and the center column of each node"""
+
+    row_widths = [
+        sum(_node_width(node) for node in row) + BOX_SPACING * (len(row) - 1)
+        for row in rows
+    ]
+    total_width = max(row_widths)
+    lefts = {}
+    centers = {}
+    for row, row_width in zip(rows, row_widths):
+        left = (total_width - row_width) // 2
+        for node in row:
+            lefts[node] = left
+            centers[node] = left + _node_width(node) // 2
+            left += _node_width(node) + BOX_SPACING
+    return total_width, lefts, centers
+
+
+def _draw_boxes(row: list, lefts: dict, total_width: int) -> list[list[str]]:
+    """Draw the boxes of the stages of a level and the vertical lines
+    crossing it"""
+
+    box = [[" "] * total_width for _ in range(BOX_HEIGHT)]
+    for node in row:
+        x = lefts[node]
+        if isinstance(node, tuple):
+            for box_line in box:
+                box_line[x] = "|"
+            continue
+        width = _node_width(node)
+        border = "+" + "-" * (width - 2) + "+"
+        box[0][x : x + width] = border
+        box[1][x : x + width] = f"| {node:<{width - 4}} |"
+        box[2][x : x + width] = border
+    return box
+
+
+def _put(line: list[str], x: int, char: str):
+    """Draw a character of a link without drawing over a corner or a
+    crossing"""
+
+    if line[x] not in "+":
+        line[x] = char
+
+
+def _draw_connectors(
+    links: list, centers: dict, total_width: int
+) -> list[list[str]]:
+    """Draw the links to the next level: a vertical line under the sources,
+    a horizontal line to the targets then an arrow"""
+
+    connector = [[" "] * total_width for _ in range(BOX_HEIGHT)]
+    for source, target in links:
+        start, end = centers[source], centers[target]
+        _put(connector[0], start, "|")
+        if start == end:
+            _put(connector[1], start, "|")
+        else:
+            for x in range(min(start, end) + 1, max(start, end)):
+                if connector[1][x] == " ":
+                    connector[1][x] = "-"
+            connector[1][start] = "+"
+            connector[1][end] = "+"
+        _put(connector[2], end, "|" if isinstance(target, tuple) else "v")
+    return connector
+
+
+def render_ascii(dag: Dag) -> str:
+    """Draw the graph with a box for each stage, level by level
+
+    Parameters
+    ----------
+    dag: Dag
+        graph of the stages
+    """
+
+    if not dag.nodes:
+        return ""
+
+    levels = dag.levels()
+    rows, links = _split_edges(dag, levels)
+    _order_rows(rows, links)
+    total_width, lefts, centers = _layout_rows(rows)
+
+    # The links drawn above each level, grouped once by their target
+    links_above: list[list] = [[] for _ in rows]
+    for source, target in links:
+        level = target[1] if isinstance(target, tuple) else levels[target]
+        links_above[level].append((source, target))
+
+    lines = []
+    for level, row in enumerate(rows):
+        lines.extend(_draw_boxes(row, lefts, total_width))
+        if level < len(rows) - 1:
+            lines.extend(
+                _draw_connectors(links_above[level + 1], centers, total_width)
+            )
+    return "\n".join("".join(line).rstrip() for line in lines)
+
+
+def render_mermaid(dag: Dag) -> str:
+    """Write the graph as a mermaid flowchart
+
+    Parameters
+    ----------
+    dag: Dag
+        graph of the stages
+    """
+
+    ids = {name: f"node{i + 1}" for i, name in enumerate(dag.nodes)}
+    lines = ["flowchart TD"]
+    for name in dag.nodes:
+        lines.append(f'\t{ids[name]}["{name}"]')
+    for source, targets in dag.edges.items():
+        for target in targets:
+            lines.append(f"\t{ids[source]}-->{ids[target]}")
+    return "\n".join(lines)
+
+
+def render_dot(dag: Dag) -> str:
+    """Write the graph in the graphviz dot language
+
+    Parameters
+    ----------
+    dag: Dag
+        graph of the stages
+    """
+
+    lines = ["strict digraph  {"]
+    for name in dag.nodes:
+        lines.append(f'"{name}";')
+    for source, targets in dag.edges.items():
+        for target in targets:
+            lines.append(f'"{source}" -> "{target}";')
+    lines.append("}")
+    return "\n".join(lines)
+
+
+RENDERERS = {
+    "ascii": render_ascii,
+    "mermaid": render_mermaid,
+    "dot": render_dot,
+}
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .artifacts import write_file
+from .bulkcopy import CopyStats
+from .globals import HASHES_FOLDER
+from .packagemanifest import format_size
+from .yamlio import load_yaml
+
+# Number of data files imported at the same time by default
+DEFAULT_PULL_JOBS = 4
+# Cache of the md5 of the imported data files
+IMPORTS_HASHES_PATH = f"{HASHES_FOLDER}/imports.json"
+# Version of the hashes cache, bump it when the format of the cache changes
+HASHES_VERSION = 1
+# Etag of the objects uploaded at once, the md5 of their content
+MD5_ETAG = re.compile(r"[0-9a-f]{32}")
+
+
+class ImportHashes:
+    """Class to cache the md5 of the imported data files on disk, the md5 of
+    a file is only computed again when its inode, size or mtime changed"""
+
+    def __init__(self, path: str = IMPORTS_HASHES_PATH):
+        self.__path = pathlib.Path(path)
+        # Hashes of the files by absolute path:
+        # [inode, size, mtime, algorithm, md5]
+        self.__hashes = {}
+        self.__changed = False
+
+        try:
+            with open(self.__path, "r") as hashes_f:
+                hashes = json.load(hashes_f)
+        except (OSError, ValueError):
+            return
+        if hashes.get("version") == HASHES_VERSION:
+            self.__hashes = hashes["files"]
+
+    def md5(self, path: str, algorithm: str) -> str:
+        """Get the md5 of a file the way dvc computes it
+
+        Parameters
+        ----------
+        path: str
+            path of the file
+        algorithm: str
+            md5, or md5-dos2unix for the .dvc files of dvc 2 which hash the
+            text files with unix line endings
+        """
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = [stat.st_ino, stat.st_size, stat.st_mtime_ns, algorithm]
+
+        cached = self.__hashes.get(path)
+        if cached and cached[:4] == key:
+            return cached[4]
+
+        # dvc is only loaded when a file has to be hashed
+        from dvc_data.hashfile.hash import file_md5
+
+        md5 = file_md5(path, name=algorithm)
+        self.__hashes[path] = [*key, md5]
+        self.__changed = True
+        return md5
+
+    def save(self):
+        """Save the cache if hashes were computed"""
+
+        if not self.__changed:
+            return
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(
+            str(self.__path),
+            json.dumps({"version": HASHES_VERSION, "files": self.__hashes}),
+            verbose=False,
+        )
+        self.__changed = False
+
+
+def is_fresh(dvc_file: str, hashes: ImportHashes) -> bool:
+    """Check if the data file of an import matches the md5 recorded in its
+    .dvc file, the file doesn't need to be imported again then
+
+    Parameters
+    ----------
+    dvc_file: str
+        path of the .dvc file of the import
+    hashes: ImportHashes
+        cache of the md5 of the data files
+    """
+
+    try:
+        dvc = load_yaml(dvc_file)
+        out = dvc["outs"][0]
+        dep = dvc["deps"][0]
+    except (OSError, KeyError, IndexError, TypeError):
+        return False
+
+    md5 = out.get("md5")
+    algorithm = "md5" if out.get("hash") == "md5" else "md5-dos2unix"
+    if not md5 and MD5_ETAG.fullmatch(str(dep.get("etag", ""))):
+        # The etag of an object uploaded at once is the md5 of its content
+        md5, algorithm = dep["etag"], "md5"
+    # The imported folders are always imported again
+    if not md5 or md5.endswith(".dir"):
+        return False
+
+    path = os.path.join(os.path.dirname(dvc_file), out["path"])
+    if not os.path.isfile(path):
+        return False
+    # Comparing the sizes avoids hashing the files that changed
+    if "size" in out and os.path.getsize(path) != out["size"]:
+        return False
+    return hashes.md5(path, algorithm) == md5
+
+
+def find_dvc_files(folder: str = "data") -> list[str]:
+    """Find the .dvc files of a folder, sorted by path
+
+    Parameters
+    ----------
+    folder: str
+        folder of the data files
+    """
+
+    dvc_files = []
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.endswith(".dvc"):
+                dvc_files.append(os.path.join(root, file))
+    return sorted(dvc_files)
+
+
+def _output_size(path: str) -> int:
+    """Size of an imported file or folder"""
+
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, file))
+            for root, dirs, files in os.walk(path)
+            for file in files
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def pull_imports(
+    dvc_files: list[str],
+    jobs: int = DEFAULT_PULL_JOBS,
+    root: str = ".",
+    hashes_path: str = IMPORTS_HASHES_PATH,
+) -> CopyStats:
+    """Import the data files of the .dvc files again from their urls, the
+    files are imported concurrently in a single dvc repo. The files matching
+    the md5 of their .dvc file are up to date and aren't downloaded. Returns
+    the throughput of the imports
+
+    Parameters
+    ----------
+    dvc_files: list[str]
+        paths of the .dvc files of the imports, relative to the root
+    jobs: int
+        number of files imported at the same time
+    root: str
+        root of the dvc repo
+    hashes_path: str
+        path of the cache of the md5 of the data files
+    """
+
+    start = time.perf_counter()
+    print_lock = threading.Lock()
+    pulled: list[str] = []
+    failed: list[str] = []
+
+    # Only the files that changed since they were imported are downloaded
+    hashes = ImportHashes(hashes_path)
+    outdated = []
+    fresh = 0
+    for dvc_file in dvc_files:
+        if is_fresh(os.path.join(root, dvc_file), hashes):
+            print("Up to date:", dvc_file.removesuffix(".dvc"))
+            fresh += 1
+        else:
+            outdated.append(dvc_file)
+    hashes.save()
+
+    # Each thread imports with its own dvc repo, dvc doesn't share a repo,
+    # its state database or its stages between threads
+    local = threading.local()
+    repos: list = []
+
+    def pull(dvc_file: str) -> int:
+        """Import the data file of a .dvc file and write its .dvc file"""
+
+        out = dvc_file.removesuffix(".dvc")
+        file_start = time.perf_counter()
+        try:
+            if not hasattr(local, "repo"):
+                local.repo = Repo(root)
+                # The repo lock is held once for all the threads
+                local.repo.lock = repo.lock
+                repos.append(local.repo)
+            stage = local.repo.stage.load_one(dvc_file)
+
+            out = str(stage.outs[0])
+            with print_lock:
+                print("Pulling", stage.deps[0], "to", out)
+
+            # Like dvc import-url, the data is downloaded even if it is
+            # already in the workspace
+            update_import(stage, jobs=1, force=True)
+            stage.dump()
+        except Exception as e:
+            with print_lock:
+                print(f"Failed to pull {out}: {e}")
+                failed.append(out)
+            return 0
+
+        size = _output_size(os.path.join(root, out))
+        seconds = max(time.perf_counter() - file_start, 1e-6)
+        with print_lock:
+            print(
+                f"Pulled {out} ({format_size(size)}, "
+                f"{size / seconds / 1024 / 1024:.1f} MB/s)"
+            )
+            pulled.append(out)
+        return size
+
+    sizes = []
+    if outdated:
+        # dvc is only loaded when data has to be pulled
+        from dvc.repo import Repo
+        from dvc.stage.imports import update_import
+
+        with Repo(root) as repo:
+            # The repo is locked once for all the imports
+            with repo.lock:
+                loaded = []
+                for dvc_file in outdated:
+                    try:
+                        stage = repo.stage.load_one(dvc_file)
+                        # The outputs are added to their .gitignore file
+                        # before the imports start, git doesn't lock it
+                        for output in stage.outs:
+                            output.ignore()
+                        loaded.append(dvc_file)
+                    except Exception as e:
+                        out = dvc_file.removesuffix(".dvc")
+                        print(f"Failed to pull {out}: {e}")
+                        failed.append(out)
+
+                try:
+                    if len(loaded) > 1 and jobs > 1:
+                        with ThreadPoolExecutor(max_workers=jobs) as executor:
+                            sizes = list(executor.map(pull, loaded))
+                    else:
+                        local.repo = repo
+                        sizes = [pull(dvc_file) for dvc_file in loaded]
+                finally:
+                    for worker_repo in repos:
+                        worker_repo.close()
+
+    stats = CopyStats(len(pulled), sum(sizes), time.perf_counter() - start)
+    print(
+        f"{len(pulled)} files pulled ({format_size(stats.size)}) "
+        f"in {stats.seconds:.1f}s ({stats}), {fresh} files up to date, "
+        f"{len(failed)} files failed"
+    )
+    return stats
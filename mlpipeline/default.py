@@ -1,7 +1,4 @@
-import json
-import pathlib
-
-from .globals import DEFAULT_PIPELINE, PIPELINES_FOLDER
+from .registry import get_session
 
 
 def set_default_pipeline(pipeline: str):
@@ -13,30 +10,24 @@ def set_default_pipeline(pipeline: str):
 
     # Check if the pipeline exists
     # If it does, set it as the default pipeline
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            if pipeline in pipelines:
-                pipelines[DEFAULT_PIPELINE] = pipeline
-                with open(pipelines_path, "w") as pipelines_f:
-                    json.dump(pipelines, pipelines_f)
-                print(f"Pipeline {pipeline} set as default")
-                return
+    registry = get_session()
+    if registry.exists() and registry.has_pipeline(pipeline):
+        registry.set_default(pipeline)
+        print(f"Pipeline {pipeline} set as default")
+        return
     print(f"Pipeline {pipeline} does not exist")
 
 
 def get_default_pipeline():
-    # Check if the default pipeline exists in the pipelines.json file
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            if DEFAULT_PIPELINE not in pipelines:
-                print(f"Default pipeline not found")
+    # Check if the default pipeline is set in the registry
+    registry = get_session()
+    if registry.exists():
+        default_pipeline = registry.get_default()
+        if default_pipeline is None:
+            print(f"Default pipeline not found")
+            return None
+        else:
+            if len(default_pipeline) == 0:
+                print(f"No default pipeline set")
                 return None
-            else:
-                if len(pipelines[DEFAULT_PIPELINE]) == 0:
-                    print(f"No default pipeline set")
-                    return None
-            return pipelines[DEFAULT_PIPELINE]
+        return default_pipeline
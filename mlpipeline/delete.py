@@ -1,11 +1,12 @@
-import json
 import os
 import pathlib
 import shutil
 
-import yaml
-
-from .globals import DEFAULT_PIPELINE, PIPELINES_FOLDER
+from .artifacts import dump_yaml
+from .globals import PIPELINES_FOLDER
+from .locks import get_lock, pipeline_lock
+from .registry import get_session
+from .yamlio import load_yaml
 
 
 def delete_pipeline(pipeline: str):
@@ -16,80 +17,73 @@ def delete_pipeline(pipeline: str):
         name of the pipeline
     """
 
-    # Remove the folder and its contents
-    if not pathlib.Path(f"{PIPELINES_FOLDER}/{pipeline}").exists():
-        print(f"Pipeline {pipeline} not found")
-        return
-
-    shutil.rmtree(f"{PIPELINES_FOLDER}/{pipeline}")
-
-    # Remove all files starting with the name of the pipeline prefix insie the .github/workflows folder
-    gha_path = ".github/workflows"
-    prefix = pipeline
-    if pathlib.Path(gha_path).exists():
-        for file_name in os.listdir(gha_path):
-            if file_name.startswith(prefix):
-                file_path = os.path.join(gha_path, file_name)
-                os.remove(file_path)
-
-    # Remove the pipeline from the matrix_runner.yaml file
-    if pathlib.Path("./.github/workflows/matrix_runner.yaml").exists():
-        with open(
-            "./.github/workflows/matrix_runner.yaml",
-            "r",
-        ) as matrix_runner_f:
-            data_matrix_runner_f = yaml.safe_load(matrix_runner_f)
-
-        if "jobs" in data_matrix_runner_f:
-            if pipeline in data_matrix_runner_f["jobs"]:
-                data_matrix_runner_f["jobs"].pop(pipeline)
-
-        data_matrix_runner_f["on"]["workflow_dispatch"]["inputs"]["PIPELINE"][
-            "options"
-        ].remove(pipeline)
-
-        with open(
-            "./.github/workflows/matrix_runner.yaml",
-            "w",
-        ) as matrix_runner_f:
-            yaml.dump(data_matrix_runner_f, matrix_runner_f, sort_keys=False)
-
-    # Remove the pipeline from the single_runner.yaml file
-    if pathlib.Path("./.github/workflows/single_runner.yaml").exists():
-        with open(
-            "./.github/workflows/single_runner.yaml",
-            "r",
-        ) as single_runner_f:
-            data_single_runner_f = yaml.safe_load(single_runner_f)
-
-        if "jobs" in data_single_runner_f:
-            if pipeline in data_single_runner_f["jobs"]:
-                data_single_runner_f["jobs"].pop(pipeline)
-
-        data_single_runner_f["on"]["workflow_dispatch"]["inputs"]["PIPELINE"][
-            "options"
-        ].remove(pipeline)
-
-        with open(
-            "./.github/workflows/single_runner.yaml",
-            "w",
-        ) as single_runner_f:
-            yaml.dump(data_single_runner_f, single_runner_f, sort_keys=False)
-
-    # Update the pipelines.json file
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            if pipeline not in pipelines:
-                print("Pipeline not found")
-                return
-            pipelines.pop(pipeline)
-            if not pipelines:
-                os.remove(pipelines_path)
-
-        with open(pipelines_path, "w") as pipelines_f:
-            json.dump(pipelines, pipelines_f)
+    # The pipeline folder isn't deleted while another command syncs or runs
+    # the pipeline
+    with pipeline_lock(pipeline):
+        # Remove the folder and its contents
+        if not pathlib.Path(f"{PIPELINES_FOLDER}/{pipeline}").exists():
+            print(f"Pipeline {pipeline} not found")
+            return
+
+        shutil.rmtree(f"{PIPELINES_FOLDER}/{pipeline}")
+
+        # Remove all files starting with the name of the pipeline prefix insie the .github/workflows folder
+        gha_path = ".github/workflows"
+        prefix = pipeline
+        if pathlib.Path(gha_path).exists():
+            for file_name in os.listdir(gha_path):
+                if file_name.startswith(prefix):
+                    file_path = os.path.join(gha_path, file_name)
+                    os.remove(file_path)
+
+        # The runners workflows are shared with the other commands
+        with get_lock("workflows"):
+            # Remove the pipeline from the matrix_runner.yaml file
+            if pathlib.Path("./.github/workflows/matrix_runner.yaml").exists():
+                data_matrix_runner_f = load_yaml(
+                    "./.github/workflows/matrix_runner.yaml"
+                )
+
+                if "jobs" in data_matrix_runner_f:
+                    if pipeline in data_matrix_runner_f["jobs"]:
+                        data_matrix_runner_f["jobs"].pop(pipeline)
+
+                data_matrix_runner_f["on"]["workflow_dispatch"]["inputs"][
+                    "PIPELINE"
+                ]["options"].remove(pipeline)
+
+                dump_yaml(
+                    "./.github/workflows/matrix_runner.yaml",
+                    data_matrix_runner_f,
+                    sort_keys=False,
+                )
+
+            # Remove the pipeline from the single_runner.yaml file
+            if pathlib.Path("./.github/workflows/single_runner.yaml").exists():
+                data_single_runner_f = load_yaml(
+                    "./.github/workflows/single_runner.yaml"
+                )
+
+                if "jobs" in data_single_runner_f:
+                    if pipeline in data_single_runner_f["jobs"]:
+                        data_single_runner_f["jobs"].pop(pipeline)
+
+                data_single_runner_f["on"]["workflow_dispatch"]["inputs"][
+                    "PIPELINE"
+                ]["options"].remove(pipeline)
+
+                dump_yaml(
+                    "./.github/workflows/single_runner.yaml",
+                    data_single_runner_f,
+                    sort_keys=False,
+                )
+
+    # Remove the pipeline from the registry
+    registry = get_session()
+    if registry.exists():
+        if not registry.remove_pipeline(pipeline):
+            print("Pipeline not found")
+            return
     else:
         print(f"Pipeline {pipeline} not found")
         return
@@ -100,16 +94,13 @@ def delete_pipeline(pipeline: str):
 def delete_all_pipelines():
     """Delete all the pipelines folders and the GHA files"""
 
-    # For each pipeline in pipelines.json, delete the folder and the GHA files
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            for pipeline in pipelines:
-                if pipeline != DEFAULT_PIPELINE:
-                    delete_pipeline(pipeline)
-        # delete the pipelines.json file
-        os.remove(pipelines_path)
+    # For each pipeline in the registry, delete the folder and the GHA files
+    registry = get_session()
+    if registry.exists():
+        for pipeline in registry.pipelines():
+            delete_pipeline(pipeline)
+        # delete the registry
+        registry.clear()
     else:
         print("No pipelines found")
         return
@@ -138,21 +129,14 @@ def delete_default_pipeline(pipeline: str = None):
     # Set the default pipeline to an empty string if it is the one to be deleted
     # otherwise set the default pipeline to an empty string
 
-    # verify that pipelines.json exists
-    if not pathlib.Path(f"{PIPELINES_FOLDER}/pipelines.json").exists():
+    # verify that the registry exists
+    registry = get_session()
+    if not registry.exists():
         return
 
-    with open(f"{PIPELINES_FOLDER}/pipelines.json", "r") as pipelines_f:
-        pipelines = json.load(pipelines_f)
-        if (pipeline and pipelines[DEFAULT_PIPELINE] == pipeline) or (
-            not pipeline
-        ):
-            pipelines[DEFAULT_PIPELINE] = ""
-            with open(
-                f"{PIPELINES_FOLDER}/pipelines.json", "w"
-            ) as pipelines_f:
-                json.dump(pipelines, pipelines_f)
-            print(f"Default pipeline removed")
+    if (pipeline and registry.get_default() == pipeline) or (not pipeline):
+        registry.set_default("")
+        print(f"Default pipeline removed")
 
 
 def delete(pipeline: str, all: bool):
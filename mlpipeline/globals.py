@@ -1,2 +1,7 @@
 PIPELINES_FOLDER = "pipelines"
 DEFAULT_PIPELINE = "default"
+CACHE_FOLDER = ".mlp/cache"
+STATUS_FOLDER = ".mlp/status"
+MANIFESTS_FOLDER = ".mlp/manifests"
+LOCKS_FOLDER = ".mlp/locks"
+HASHES_FOLDER = ".mlp/hashes"
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import ast
+import os
+
+from .notebookreader import read_cells
+from .notebookscanner import MAGIC_LINE
+
+
+def source_imports(source: str, package: str = "") -> set[str]:
+    """Get the names of the modules a source code may import, the names
+    imported from a module are returned too as they can be submodules
+
+    Parameters
+    ----------
+    source: str
+        python source code
+    package: str
+        package of the module, to resolve its relative imports
+    """
+
+    # Comment the magics out, they aren't python code
+    source = "\n".join(
+        f"# {line}" if MAGIC_LINE.match(line) else line
+        for line in source.splitlines()
+    )
+
+    modules: set[str] = set()
+    # The imports nested in functions and conditions are imported too
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level:
+                # Relative import: go up from the package of the module
+                parts = package.split(".") if package else []
+                parts = parts[: len(parts) - node.level + 1]
+                module = ".".join(part for part in [*parts, module] if part)
+            if module:
+                modules.add(module)
+            modules.update(
+                f"{module}.{alias.name}" if module else alias.name
+                for alias in node.names
+                if alias.name != "*"
+            )
+    return modules
+
+
+def resolve_module(module: str, roots: list[str]) -> list[tuple[str, str]]:
+    """Find the files executed when importing a module from the roots: the
+    module and the __init__.py of its packages
+
+    Parameters
+    ----------
+    module: str
+        dotted name of the module
+    roots: list[str]
+        folders the modules are imported from
+    """
+
+    parts = module.split(".")
+    for root in roots:
+        base = os.path.join(root, *parts)
+        if os.path.isfile(f"{base}.py"):
+            path = f"{base}.py"
+        elif os.path.isfile(os.path.join(base, "__init__.py")):
+            path = os.path.join(base, "__init__.py")
+        else:
+            continue
+
+        files = [(os.path.normpath(path), module)]
+        # The packages of the module are imported first
+        for index in range(1, len(parts)):
+            init = os.path.join(root, *parts[:index], "__init__.py")
+            if os.path.isfile(init):
+                files.append((os.path.normpath(init), ".".join(parts[:index])))
+        return files
+    return []
+
+
+def notebooks_modules(notebooks: list[str], roots: list[str]) -> set[str]:
+    """Get the local modules the notebooks import, directly or through the
+    local modules they import. Raises a SyntaxError if a notebook or a module
+    can't be parsed
+
+    Parameters
+    ----------
+    notebooks: list[str]
+        paths of the notebooks
+    roots: list[str]
+        folders the modules are imported from
+    """
+
+    pending: list[str] = []
+    for notebook in notebooks:
+        for cell_type, source in read_cells(notebook):
+            if cell_type == "code":
+                pending.extend(source_imports(source))
+
+    seen = set()
+    files = set()
+    while pending:
+        module = pending.pop()
+        if module in seen:
+            continue
+        seen.add(module)
+
+        for path, module in resolve_module(module, roots):
+            if path in files:
+                continue
+            files.add(path)
+
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            # A package resolves its relative imports from itself
+            package = (
+                module
+                if os.path.basename(path) == "__init__.py"
+                else module.rpartition(".")[0]
+            )
+            pending.extend(source_imports(source, package))
+    return files
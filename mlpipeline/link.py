@@ -1,7 +1,5 @@
-import json
-import pathlib
-
-from .globals import PIPELINES_FOLDER
+from .registry import get_session
+from .utils import get_notebooks_from_str
 
 
 def link_notebooks_to_pipeline(notebooks: str, pipeline: str):
@@ -14,14 +12,10 @@ def link_notebooks_to_pipeline(notebooks: str, pipeline: str):
         name of the pipeline
     """
 
-    # Update the pipelines.json file
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            pipelines[pipeline] = notebooks
-        with open(pipelines_path, "w") as pipelines_f:
-            json.dump(pipelines, pipelines_f)
+    # Update the notebooks of the pipeline in the registry
+    registry = get_session()
+    if registry.exists():
+        registry.link(pipeline, get_notebooks_from_str(notebooks))
     else:
         print("No pipelines found")
         return
@@ -1,20 +1,16 @@
-import json
-import pathlib
-
-from .globals import DEFAULT_PIPELINE, PIPELINES_FOLDER
+from .registry import get_session
+from .utils import get_str_from_notebooks
 
 
 def list_pipelines():
     """List the pipelines"""
 
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            for pipeline in pipelines:
-                if pipeline != DEFAULT_PIPELINE:
-                    print(
-                        f"{'[Default] ' if pipelines[DEFAULT_PIPELINE] == pipeline else ''}Pipeline: {pipeline}, notebooks: {pipelines[pipeline]}"
-                    )
+    registry = get_session()
+    if registry.exists():
+        default_pipeline = registry.get_default()
+        for pipeline, notebooks in registry.all_notebooks().items():
+            print(
+                f"{'[Default] ' if default_pipeline == pipeline else ''}Pipeline: {pipeline}, notebooks: {get_str_from_notebooks(notebooks)}"
+            )
     else:
         print("No pipelines found")
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+import time
+from types import ModuleType
+
+from .globals import LOCKS_FOLDER
+
+# fcntl is missing on windows
+fcntl: ModuleType | None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Class to lock a scope across the threads of a command and across the
+    mlp commands running at the same time on the project"""
+
+    # The threads of a command are excluded by a reentrant lock, the commands
+    # by an advisory lock on a file of the locks folder, held by the first
+    # acquisition of the thread and released by its last release. Without
+    # fcntl only the threads of a command are excluded.
+    # The scopes are taken in this order to avoid deadlocks: pipeline,
+    # project, workflows. The registry is locked last, no other scope is
+    # taken while it is held
+
+    def __init__(self, scope: str, folder: str = LOCKS_FOLDER):
+        self.__scope = scope
+        self.__folder = folder
+        self.__lock = threading.RLock()
+        # Number of acquisitions of the thread holding the lock
+        self.__depth = 0
+        self.__file = None
+
+    def __lock_file(self):
+        """Lock the file of the scope, waiting for the other commands"""
+
+        if fcntl is None:
+            return
+
+        path = pathlib.Path(self.__folder) / f"{self.__scope}.lock"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.__file = open(path, "a")
+        try:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            pass
+        except BaseException:
+            self.__unlock_file()
+            raise
+
+        # Another command holds the lock, report how long it is waited for
+        print(f"Waiting for the {self.__scope} lock held by another command")
+        start = time.perf_counter()
+        try:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            self.__unlock_file()
+            raise
+        print(
+            f"Lock {self.__scope} acquired after "
+            f"{time.perf_counter() - start:.1f}s"
+        )
+
+    def __unlock_file(self):
+        """Release the lock on the file of the scope"""
+
+        if self.__file is not None:
+            # Closing the file releases its lock
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self) -> FileLock:
+        self.__lock.acquire()
+        self.__depth += 1
+        if self.__depth == 1:
+            try:
+                self.__lock_file()
+            except BaseException:
+                self.__depth -= 1
+                self.__lock.release()
+                raise
+        return self
+
+    def __exit__(self, *args):
+        self.__depth -= 1
+        if self.__depth == 0:
+            self.__unlock_file()
+        self.__lock.release()
+
+
+# Locks of the scopes, a scope has one lock per process
+_LOCKS: dict[str, FileLock] = {}
+_LOCKS_LOCK = threading.Lock()
+
+
+def get_lock(scope: str) -> FileLock:
+    """Get the lock of a scope
+
+    Parameters
+    ----------
+    scope: str
+        name of the locked scope, used as the name of its lock file
+    """
+
+    with _LOCKS_LOCK:
+        if scope not in _LOCKS:
+            _LOCKS[scope] = FileLock(scope)
+        return _LOCKS[scope]
+
+
+def pipeline_lock(pipeline: str) -> FileLock:
+    """Get the lock of the folder of a pipeline
+
+    Parameters
+    ----------
+    pipeline: str
+        name of the pipeline
+    """
+
+    return get_lock(f"pipeline-{pipeline}")
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+
+from .artifacts import write_file
+from .globals import CACHE_FOLDER
+
+# Version of the cache entries, bump it when the format of the entries changes
+CACHE_VERSION = 2
+# Maximum size of the cache folder in bytes before evicting the oldest entries
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class NotebookCache:
+    """Class to cache the specs extracted from the notebooks on disk"""
+
+    # Each notebook has its own entry file inside the cache folder, the entry is
+    # valid as long as the size and mtime of the notebook didn't change or,
+    # if they did, as long as the content hash of the notebook is the same
+
+    def __init__(
+        self, folder: str = CACHE_FOLDER, max_size: int = MAX_CACHE_SIZE
+    ):
+        self.__folder = pathlib.Path(folder)
+        self.__max_size = max_size
+        # Fingerprints of the notebooks computed during the lookups
+        self.__fingerprints: dict[str, tuple[int, int, str]] = {}
+
+    def __entry_path(self, notebook: str, mode: str) -> pathlib.Path:
+        """Get the path of the cache entry of a notebook
+
+        Parameters
+        ----------
+        notebook: str
+            path of the notebook
+        mode: str
+            mode used to extract the spec of the notebook
+        """
+        key = hashlib.sha1(
+            os.path.normpath(notebook).encode("utf-8")
+        ).hexdigest()
+        return self.__folder / f"{key}.{mode}.json"
+
+    def __load_entry(self, entry_path: pathlib.Path) -> dict | None:
+        """Load a cache entry, returns None if it is missing or invalid
+
+        Parameters
+        ----------
+        entry_path: pathlib.Path
+            path of the cache entry
+        """
+        try:
+            with open(entry_path, "r") as entry_f:
+                entry = json.load(entry_f)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            not isinstance(entry, dict)
+            or entry.get("version") != CACHE_VERSION
+        ):
+            return None
+        return entry
+
+    def __save_entry(self, entry_path: pathlib.Path, entry: dict):
+        """Save a cache entry atomically
+
+        Parameters
+        ----------
+        entry_path: pathlib.Path
+            path of the cache entry
+        entry: dict
+            content of the cache entry
+        """
+        self.__folder.mkdir(parents=True, exist_ok=True)
+        write_file(str(entry_path), json.dumps(entry), verbose=False)
+
+    @staticmethod
+    def __hash_file(notebook: str) -> str:
+        """Compute the content hash of a notebook
+
+        Parameters
+        ----------
+        notebook: str
+            path of the notebook
+        """
+        sha256 = hashlib.sha256()
+        with open(notebook, "rb") as notebook_f:
+            for chunk in iter(lambda: notebook_f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def get(self, notebook: str, mode: str = "exec") -> dict | None:
+        """Get the cached spec of a notebook, returns None on a cache miss
+
+        Parameters
+        ----------
+        notebook: str
+            path of the notebook
+        mode: str
+            mode used to extract the spec of the notebook (exec or static)
+        """
+        # Raises FileNotFoundError if the notebook doesn't exist
+        stat = os.stat(notebook)
+        entry_path = self.__entry_path(notebook, mode)
+        entry = self.__load_entry(entry_path)
+
+        # Same size and mtime, the notebook didn't change
+        if (
+            entry
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            fingerprint = entry["hash"]
+        else:
+            fingerprint = self.__hash_file(notebook)
+            # The notebook was touched but the content is the same
+            if entry and entry["hash"] == fingerprint:
+                entry["size"] = stat.st_size
+                entry["mtime"] = stat.st_mtime_ns
+                self.__save_entry(entry_path, entry)
+
+        self.__fingerprints[notebook] = (
+            stat.st_size,
+            stat.st_mtime_ns,
+            fingerprint,
+        )
+
+        if not entry or entry["hash"] != fingerprint:
+            return None
+
+        # Touch the entry to keep track of the least recently used ones
+        os.utime(entry_path)
+        return entry["spec"]
+
+    def set(self, notebook: str, spec: dict, mode: str = "exec") -> dict:
+        """Store the spec of a notebook in the cache and returns it as
+        it will be read from the cache
+
+        Parameters
+        ----------
+        notebook: str
+            path of the notebook
+        spec: dict
+            calls extracted from the notebook for each builder
+        mode: str
+            mode used to extract the spec of the notebook (exec or static)
+        """
+        try:
+            spec = json.loads(json.dumps(spec))
+        except (TypeError, ValueError):
+            # The arguments of the calls can't be stored, skip the cache
+            return spec
+
+        if notebook in self.__fingerprints:
+            size, mtime, fingerprint = self.__fingerprints[notebook]
+        else:
+            stat = os.stat(notebook)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+            fingerprint = self.__hash_file(notebook)
+
+        entry = {
+            "version": CACHE_VERSION,
+            "path": os.path.normpath(notebook),
+            "mode": mode,
+            "size": size,
+            "mtime": mtime,
+            "hash": fingerprint,
+            "spec": spec,
+        }
+        self.__save_entry(self.__entry_path(notebook, mode), entry)
+        return spec
+
+    def prune(self):
+        """Evict the entries of the deleted notebooks and the least recently
+        used entries when the cache exceeds its maximum size"""
+
+        if not self.__folder.exists():
+            return
+
+        entries = []
+        for entry_path in self.__folder.glob("*.json"):
+            entry = self.__load_entry(entry_path)
+            # Remove the invalid entries and the ones of deleted notebooks
+            if not entry or not pathlib.Path(entry["path"]).exists():
+                entry_path.unlink(missing_ok=True)
+                continue
+            stat = entry_path.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        cache_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if cache_size <= self.__max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            cache_size -= size
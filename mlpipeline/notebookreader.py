@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import io
+import json
+import re
+from typing import Iterator
+
+from nbformat import read
+
+# Size of the chunks read from the notebook file
+CHUNK_SIZE = 64 * 1024
+# Types of the cells that can call the builders
+CELL_TYPES = ("code", "raw")
+
+NON_WHITESPACE = re.compile(r"\S")
+STRUCTURE = re.compile(r'[\[\]{}"]')
+SCALAR_END = re.compile(r"[\s,\]}]")
+
+
+class JSONStream:
+    """Class to walk through a JSON file chunk by chunk, the values are only
+    decoded when they are read, skipped values are never kept in memory"""
+
+    def __init__(self, f: io.TextIOBase):
+        self.__f = f
+        self.__buf = ""
+        self.__pos = 0
+        # Pieces of the value being read when it spans several chunks
+        self.__capture = None
+        self.__capture_start = 0
+
+    def __fill(self) -> bool:
+        """Read the next chunk of the file, returns False at the end of the file"""
+
+        chunk = self.__f.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+
+        if self.__capture is not None:
+            self.__capture.append(
+                self.__buf[self.__capture_start : self.__pos]
+            )
+            self.__capture_start = 0
+
+        self.__buf = self.__buf[self.__pos :] + chunk
+        self.__pos = 0
+        return True
+
+    def __peek(self) -> str:
+        """Get the next non whitespace character without consuming it"""
+
+        while True:
+            match = NON_WHITESPACE.search(self.__buf, self.__pos)
+            if match:
+                self.__pos = match.start()
+                return self.__buf[self.__pos]
+            self.__pos = len(self.__buf)
+            if not self.__fill():
+                raise ValueError("Unexpected end of the notebook")
+
+    def __expect(self, char: str):
+        """Consume the next non whitespace character, it has to be char
+
+        Parameters
+        ----------
+        char: str
+            the expected character
+        """
+
+        if self.__peek() != char:
+            raise ValueError(
+                f"Expected '{char}' in the notebook, got '{self.__peek()}'"
+            )
+        self.__pos += 1
+
+    def __skip_string(self):
+        """Consume the string starting at the current position"""
+
+        self.__pos += 1
+        while True:
+            # str.find is much faster than a regex on long strings (base64)
+            quote = self.__buf.find('"', self.__pos)
+            end = quote if quote != -1 else len(self.__buf)
+            backslash = self.__buf.find("\\", self.__pos, end)
+
+            if backslash != -1:
+                # Skip the escaped character, it may be in the next chunk
+                self.__pos = backslash + 1
+                while self.__pos >= len(self.__buf):
+                    if not self.__fill():
+                        raise ValueError("Unterminated string in the notebook")
+                self.__pos += 1
+            elif quote != -1:
+                self.__pos = quote + 1
+                return
+            else:
+                self.__pos = len(self.__buf)
+                if not self.__fill():
+                    raise ValueError("Unterminated string in the notebook")
+
+    def __skip_container(self):
+        """Consume the object or the array starting at the current position"""
+
+        self.__pos += 1
+        depth = 1
+        while depth:
+            match = STRUCTURE.search(self.__buf, self.__pos)
+            if not match:
+                self.__pos = len(self.__buf)
+                if not self.__fill():
+                    raise ValueError("Unexpected end of the notebook")
+                continue
+
+            char = match.group()
+            if char == '"':
+                self.__pos = match.start()
+                self.__skip_string()
+                continue
+
+            depth += 1 if char in "[{" else -1
+            self.__pos = match.end()
+
+    def __skip_scalar(self):
+        """Consume the number, boolean or null at the current position"""
+
+        while True:
+            match = SCALAR_END.search(self.__buf, self.__pos)
+            if match:
+                self.__pos = match.start()
+                return
+            self.__pos = len(self.__buf)
+            if not self.__fill():
+                return
+
+    def skip_value(self):
+        """Consume the next value without decoding it"""
+
+        char = self.__peek()
+        if char == '"':
+            self.__skip_string()
+        elif char in "[{":
+            self.__skip_container()
+        else:
+            self.__skip_scalar()
+
+    def read_value(self):
+        """Consume and decode the next value"""
+
+        self.__peek()
+        self.__capture = []
+        self.__capture_start = self.__pos
+        try:
+            self.skip_value()
+            self.__capture.append(
+                self.__buf[self.__capture_start : self.__pos]
+            )
+            return json.loads("".join(self.__capture))
+        finally:
+            self.__capture = None
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over the keys of the next object, the value of each key
+        has to be read or skipped before getting the next key"""
+
+        self.__expect("{")
+        if self.__peek() == "}":
+            self.__pos += 1
+            return
+
+        while True:
+            key = self.read_value()
+            self.__expect(":")
+            yield key
+
+            char = self.__peek()
+            self.__pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' in the notebook, got '{char}'")
+
+    def items(self) -> Iterator[int]:
+        """Iterate over the items of the next array, each item has to be
+        read or skipped before getting the next one"""
+
+        self.__expect("[")
+        if self.__peek() == "]":
+            self.__pos += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            char = self.__peek()
+            self.__pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' in the notebook, got '{char}'")
+
+
+def read_cells(notebook: str) -> Iterator[tuple[str, str]]:
+    """Read the type and the source of the code and raw cells of a notebook,
+    the outputs and attachments of the cells are skipped without being decoded
+    and the notebook is not validated against the nbformat schema
+
+    Parameters
+    ----------
+    notebook: str
+        path of the notebook
+    """
+
+    version = None
+    has_cells = False
+    with io.open(notebook, "r", encoding="utf-8") as f:
+        stream = JSONStream(f)
+        for key in stream.keys():
+            if key == "nbformat":
+                version = stream.read_value()
+            elif key == "cells":
+                has_cells = True
+                for _ in stream.items():
+                    cell_type, source = None, None
+                    for cell_key in stream.keys():
+                        if cell_key == "cell_type":
+                            cell_type = stream.read_value()
+                        elif cell_key == "source" and cell_type in (
+                            None,
+                            *CELL_TYPES,
+                        ):
+                            source = stream.read_value()
+                        else:
+                            stream.skip_value()
+
+                    if cell_type in CELL_TYPES:
+                        if isinstance(source, list):
+                            source = "".join(source)
+                        yield cell_type, source or ""
+            else:
+                stream.skip_value()
+
+    # Notebooks older than the v4 format don't have a cells list,
+    # let nbformat convert them
+    if not has_cells and version is not None and version < 4:
+        with io.open(notebook, "r", encoding="utf-8") as f:
+            nb = read(f, 4)
+        for cell in nb.cells:
+            if cell.cell_type in CELL_TYPES:
+                yield cell.cell_type, cell.source
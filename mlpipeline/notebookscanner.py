@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import ast
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from .globals import PIPELINES_FOLDER
+from .notebookcache import NotebookCache
+from .notebookreader import read_cells
+
+# Names of the builders inside the notebook's cells
+BUILDERS = ("pipeline", "report")
+
+# IPython magics and shell commands are not valid python
+MAGIC_LINE = re.compile(r"^\s*[%!]")
+
+
+class CallRecorder:
+    """Class standing in for a builder inside the notebook's cells,
+    it records the methods called on it so they can be cached and replayed"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def record(*args, **kwargs):
+            self.calls.append([method, list(args), kwargs])
+
+        return record
+
+
+def execute_cell(source: str, recorders: dict, context: dict):
+    """Execute the cell with the recorders standing in for the builders
+
+    Parameters
+    ----------
+    source: str
+        source code of the cell
+    recorders: dict
+        recorders of the builders calls
+    context: dict
+        variables shared by the cells of the notebook
+    """
+
+    context.update(recorders)
+    exec(source, context)
+
+
+def interpret_cell(source: str, recorders: dict):
+    """Record the literal calls made on the builders in the cell
+    without executing it, nothing is imported from the user code
+
+    Parameters
+    ----------
+    source: str
+        source code of the cell
+    recorders: dict
+        recorders of the builders calls
+    """
+
+    # Comment the magics out to keep the line numbers of the cell
+    source = "\n".join(
+        f"# {line}" if MAGIC_LINE.match(line) else line
+        for line in source.splitlines()
+    )
+
+    # Only the top level statements of the cell are interpreted
+    for node in ast.parse(source).body:
+        # Keep the expressions that are calls on a builder: name.method(...)
+        if not (
+            isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+        ):
+            continue
+        call = node.value
+        if not (
+            isinstance(call.func, ast.Attribute)
+            and isinstance(call.func.value, ast.Name)
+            and call.func.value.id in recorders
+        ):
+            continue
+
+        builder, method = call.func.value.id, call.func.attr
+        try:
+            args = []
+            for arg in call.args:
+                if isinstance(arg, ast.Starred):
+                    args.extend(ast.literal_eval(arg.value))
+                else:
+                    args.append(ast.literal_eval(arg))
+
+            kwargs = {}
+            for keyword in call.keywords:
+                if keyword.arg is None:
+                    kwargs.update(ast.literal_eval(keyword.value))
+                else:
+                    kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"Line {node.lineno}: the arguments of {builder}.{method} "
+                "must be literals"
+            )
+
+        getattr(recorders[builder], method)(*args, **kwargs)
+
+
+def scan_notebook(notebook: str, static: bool = False) -> dict:
+    """Find the cells of the notebook calling the builders and record the
+    calls made on each builder
+
+    Parameters
+    ----------
+    notebook: str
+        path of the notebook
+    static: bool
+        interpret the cells statically instead of executing them
+    """
+
+    # The cells of a notebook share the same context
+    recorders = {name: CallRecorder() for name in BUILDERS}
+    context: dict = {}
+
+    # The notebook is streamed, only the sources of the code and raw cells
+    # are decoded, the outputs are skipped
+    for _, source in read_cells(notebook):
+        # Look for the builders methods inside the notebook's cells
+        if not any(f"{name}." in source for name in BUILDERS):
+            continue
+
+        # Record the builders methods
+        if static:
+            try:
+                interpret_cell(source, recorders)
+            except (SyntaxError, ValueError) as e:
+                raise ValueError(f"{notebook}: {e}") from e
+        else:
+            execute_cell(source, recorders, context)
+
+    return {name: recorder.calls for name, recorder in recorders.items()}
+
+
+def extract_notebooks(
+    notebooks: list[str],
+    subfolder: str = None,
+    static: bool = False,
+    jobs: int = 1,
+) -> list[dict]:
+    """Extract the spec (the calls made on each builder) of the notebooks,
+    each notebook is read once and only if it changed since the last sync
+
+    Parameters
+    ----------
+    notebooks: list[str]
+        list of the notebooks
+    subfolder: str
+        name of the pipeline the notebooks are located in
+    static: bool
+        interpret the cells statically instead of executing them
+    jobs: int
+        number of processes used to scan the notebooks that changed
+    """
+
+    cache = NotebookCache()
+    mode = "static" if static else "exec"
+
+    # Get the specs of the unchanged notebooks from the cache
+    paths = []
+    specs: list[dict | None] = []
+    for notebook in notebooks:
+        if subfolder:
+            notebook = f"{PIPELINES_FOLDER}/{subfolder}/{notebook}"
+
+        try:
+            specs.append(cache.get(notebook, mode))
+        except FileNotFoundError:
+            print(f"File {notebook} not found!")
+            raise
+        paths.append(notebook)
+
+    # Scan the notebooks that changed
+    missing = [i for i, spec in enumerate(specs) if spec is None]
+    if jobs > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(missing))) as pool:
+            futures = {
+                i: pool.submit(scan_notebook, paths[i], static)
+                for i in missing
+            }
+            # The results are merged in the order of the notebooks
+            for i in missing:
+                specs[i] = cache.set(paths[i], futures[i].result(), mode)
+    else:
+        for i in missing:
+            specs[i] = cache.set(
+                paths[i], scan_notebook(paths[i], static), mode
+            )
+
+    # Evict the deleted notebooks from the cache
+    cache.prune()
+
+    # All the specs are set once the changed notebooks are scanned
+    return [spec for spec in specs if spec is not None]
+
+
+def replay_calls(builder: object, calls: list):
+    """Call the recorded methods on the builder
+
+    Parameters
+    ----------
+    builder: object
+        builder to replay the calls on
+    calls: list
+        list of the recorded calls
+    """
+
+    for method, args, kwargs in calls:
+        getattr(builder, method)(*args, **kwargs)
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import pathlib
+import tarfile
+import tempfile
+import time
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .artifacts import UMASK
+from .globals import PIPELINES_FOLDER
+from .notebookscanner import extract_notebooks
+from .packagebuilder import PackageBuilder
+from .packagemanifest import format_size
+from .pipelinebuilder import pipeline_steps
+from .registry import get_session
+from .reportbuilder import (
+    DVC_CONFIGS,
+    DVC_LOCAL_FOLDERS,
+    report_steps,
+    shared_cache_config,
+)
+from .yamlio import dump_yaml_str
+
+# Codecs of the archives by extension
+ARCHIVE_EXTENSIONS = {
+    ".tar.zst": "zst",
+    ".tzst": "zst",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+    ".tar": "none",
+}
+# Compression levels used when none is given
+DEFAULT_LEVELS = {"zst": 3, "gz": 6, "bz2": 9, "xz": 6}
+# Lowest and highest compression levels of the codecs
+LEVEL_RANGES = {"zst": (1, 22), "gz": (1, 9), "bz2": (1, 9), "xz": (0, 9)}
+# Modification time of the generated members, fixed so the same files give
+# the same archive
+ARCHIVE_MTIME = 0
+
+
+def archive_codec(archive: str) -> str:
+    """Get the codec of an archive from its extension
+
+    Parameters
+    ----------
+    archive: str
+        path of the archive
+    """
+
+    for extension, codec in ARCHIVE_EXTENSIONS.items():
+        if archive.endswith(extension):
+            return codec
+    raise ValueError(
+        f"Unknown archive extension for {archive}, use one of "
+        + ", ".join(ARCHIVE_EXTENSIONS)
+        + " or set the codec"
+    )
+
+
+def check_level(codec: str, level: int | None):
+    """Check the compression level of a codec, raise a ValueError if the
+    codec doesn't support it
+
+    Parameters
+    ----------
+    codec: str
+        zst, gz, bz2, xz or none
+    level: int | None
+        compression level, the default of the codec if None
+    """
+
+    if level is None or codec not in LEVEL_RANGES:
+        return
+    lowest, highest = LEVEL_RANGES[codec]
+    if not lowest <= level <= highest:
+        raise ValueError(
+            f"The level of the {codec} codec must be between {lowest} and "
+            f"{highest}, got {level}"
+        )
+
+
+def open_compressor(
+    f: BinaryIO,
+    codec: str,
+    level: int | None = None,
+    threads: int | None = None,
+) -> BinaryIO | io.BufferedIOBase:
+    """Wrap a binary file in a stream compressing what is written in it
+
+    Parameters
+    ----------
+    f: BinaryIO
+        file the compressed data is written in
+    codec: str
+        zst, gz, bz2, xz or none
+    level: int | None
+        compression level, the default of the codec if None
+    threads: int | None
+        number of threads compressing the data, only zst compresses with
+        several threads, all the cores are used if None
+    """
+
+    check_level(codec, level)
+    if level is None:
+        level = DEFAULT_LEVELS.get(codec, 0)
+    if codec == "zst":
+        if zstandard is None:
+            raise ImportError(
+                "The zst codec needs the zstandard package: "
+                "pip install zstandard"
+            )
+        compressor = zstandard.ZstdCompressor(
+            level=level, threads=-1 if threads is None else threads
+        )
+        return compressor.stream_writer(f, closefd=False)
+    if codec == "gz":
+        # No timestamp in the header so the same files give the same archive
+        return gzip.GzipFile(
+            fileobj=f, mode="wb", compresslevel=level, mtime=0
+        )
+    if codec == "bz2":
+        return bz2.BZ2File(f, "wb", compresslevel=level)
+    if codec == "xz":
+        return lzma.LZMAFile(f, "wb", preset=level)
+    return f
+
+
+def package_files(
+    pipeline: str,
+    notebooks: list[str],
+    static: bool = False,
+    jobs: int = 1,
+    sparse: bool = False,
+    prune_deps: bool = False,
+) -> tuple[dict, dict]:
+    """Get the files a sync would put in the pipeline folder without
+    writing any of them. Returns the copied files: path in the package ->
+    source path, and the generated ones: path in the package -> content
+
+    Parameters
+    ----------
+    pipeline: str
+        name of the pipeline
+    notebooks: list[str]
+        list of the notebooks
+    static: bool
+        interpret the notebook's cells statically instead of executing them
+    jobs: int
+        number of processes used to read the notebooks
+    sparse: bool
+        package only the data files the stages of the pipeline depend on
+    prune_deps: bool
+        package only the modules of the folder dependencies the notebooks
+        import
+    """
+
+    # Build the pipeline and the report in memory, like the sync of a
+    # pipeline without the main project
+    specs = extract_notebooks(notebooks, static=static, jobs=jobs)
+    builder = pipeline_steps(notebooks, specs=specs, save=False)
+    dvc = {"stages": builder.get_dvc_stages()}
+
+    files = (
+        PackageBuilder()
+        .collect(
+            notebooks, pipeline, dvc, sparse=sparse, prune_deps=prune_deps
+        )
+        .files()
+    )
+    contents = {"dvc.yaml": dump_yaml_str(dvc)}
+
+    # The params of the pipeline if it was synced, else the main project ones
+    params_yml = f"{PIPELINES_FOLDER}/{pipeline}/params.yaml"
+    for params in [params_yml, "params.yaml"]:
+        if pathlib.Path(params).exists():
+            files["params.yaml"] = params
+            files["notebooks/params.yaml"] = params
+            break
+    else:
+        contents["params.yaml"] = dump_yaml_str(builder.get_params())
+        contents["notebooks/params.yaml"] = contents["params.yaml"]
+
+    report = report_steps(notebooks, pipeline, specs, save=False)
+    contents[f".github/workflows/{pipeline}.yaml"] = dump_yaml_str(
+        report.get_workflow(pipeline), sort_keys=False
+    )
+
+    # The dvc config without the cache, shared with the main project once
+    # the archive is extracted in the pipeline folder
+    for entry in os.listdir("./.dvc"):
+        path = os.path.join("./.dvc", entry)
+        if entry in DVC_LOCAL_FOLDERS or entry in DVC_CONFIGS:
+            continue
+        if os.path.isdir(path):
+            files.update(_folder_files(path, f".dvc/{entry}"))
+        else:
+            files[f".dvc/{entry}"] = path
+    for index, config in enumerate(DVC_CONFIGS):
+        content = shared_cache_config(
+            os.path.join("./.dvc", config),
+            f"{PIPELINES_FOLDER}/{pipeline}/.dvc",
+            index == 0,
+        )
+        if content is not None:
+            contents[f".dvc/{config}"] = content
+
+    files.update(_folder_files("./outputs", "outputs"))
+    if pathlib.Path("./dvc.lock").exists():
+        files["dvc.lock"] = "./dvc.lock"
+    files[".dvcignore"] = "./.dvcignore"
+
+    return files, contents
+
+
+def _folder_files(src: str, dst: str) -> dict[str, str]:
+    """Get the files of a folder: path under dst -> source path"""
+
+    if not os.path.isdir(src):
+        return {}
+
+    files = {}
+    for root, dirs, names in os.walk(src):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.join(dst, os.path.relpath(path, src))] = path
+    return files
+
+
+def write_archive(
+    archive: str,
+    prefix: str,
+    files: dict[str, str],
+    contents: dict[str, str],
+    codec: str,
+    level: int | None = None,
+    threads: int | None = None,
+) -> int:
+    """Stream the files in a compressed tar archive, the archive is replaced
+    atomically. Returns the number of bytes archived
+
+    Parameters
+    ----------
+    archive: str
+        path of the archive
+    prefix: str
+        folder of the files in the archive
+    files: dict[str, str]
+        files to archive: path in the archive -> source path
+    contents: dict[str, str]
+        generated files to archive: path in the archive -> content
+    codec: str
+        zst, gz, bz2, xz or none
+    level: int | None
+        compression level, the default of the codec if None
+    threads: int | None
+        number of threads compressing the archive with zst
+    """
+
+    size = 0
+    folder = os.path.dirname(os.path.abspath(archive))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=folder, prefix=f".{os.path.basename(archive)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            compressed = open_compressor(f, codec, level, threads)
+            # The stream mode writes the members one after the other
+            with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                # The folders created by a sync even when empty
+                for name in ["notebooks", "outputs"]:
+                    info = tarfile.TarInfo(f"{prefix}/{name}")
+                    info.type = tarfile.DIRTYPE
+                    info.mode = 0o755
+                    info.mtime = ARCHIVE_MTIME
+                    tar.addfile(info)
+
+                for name in sorted(set(files) | set(contents)):
+                    arcname = f"{prefix}/{pathlib.Path(name).as_posix()}"
+                    if name in contents:
+                        data = contents[name].encode("utf-8")
+                        info = tarfile.TarInfo(arcname)
+                        info.size = len(data)
+                        info.mode = 0o644
+                        info.mtime = ARCHIVE_MTIME
+                        tar.addfile(info, io.BytesIO(data))
+                    else:
+                        stat = os.stat(files[name])
+                        info = tarfile.TarInfo(arcname)
+                        info.size = stat.st_size
+                        info.mode = stat.st_mode & 0o777
+                        info.mtime = int(stat.st_mtime)
+                        with open(files[name], "rb") as src_f:
+                            tar.addfile(info, src_f)
+                    size += info.size
+            if compressed is not f:
+                compressed.close()
+        os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, archive)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size
+
+
+def package(
+    pipeline: str,
+    archive: str,
+    codec: str | None = None,
+    level: int | None = None,
+    threads: int | None = None,
+    static: bool = False,
+    jobs: int = 1,
+    sparse: bool = False,
+    prune_deps: bool = False,
+):
+    """Package a pipeline in a compressed archive without syncing it, the
+    files are streamed from the main project in the archive
+
+    Parameters
+    ----------
+    pipeline: str
+        name of the pipeline
+    archive: str
+        path of the archive
+    codec: str | None
+        zst, gz, bz2, xz or none, from the extension of the archive if None
+    level: int | None
+        compression level, the default of the codec if None
+    threads: int | None
+        number of threads compressing the archive with zst, all the cores
+        if None
+    static: bool
+        interpret the notebook's cells statically instead of executing them
+    jobs: int
+        number of processes used to read the notebooks
+    sparse: bool
+        package only the data files the stages of the pipeline depend on
+    prune_deps: bool
+        package only the modules of the folder dependencies the notebooks
+        import
+    """
+
+    # Get the notebooks from the registry
+    registry = get_session()
+    if not registry.exists():
+        print("No pipelines found")
+        return
+    notebooks = registry.notebooks(pipeline)
+    if notebooks is None:
+        print("Pipeline not found")
+        return
+    if not notebooks:
+        print("No notebooks found for this pipeline")
+        return
+
+    if not codec:
+        try:
+            codec = archive_codec(archive)
+        except ValueError as e:
+            print(e)
+            return
+    if codec == "zst" and zstandard is None:
+        print(
+            "The zst codec needs the zstandard package: pip install zstandard"
+        )
+        return
+    try:
+        check_level(codec, level)
+    except ValueError as e:
+        print(e)
+        return
+
+    print("Packaging pipeline", pipeline, "...")
+    start = time.perf_counter()
+    files, contents = package_files(
+        pipeline, notebooks, static, jobs, sparse, prune_deps
+    )
+    size = write_archive(
+        archive, pipeline, files, contents, codec, level, threads
+    )
+    seconds = max(time.perf_counter() - start, 1e-6)
+
+    print(
+        f"Pipeline {pipeline} packaged in {archive}: "
+        f"{len(files) + len(contents)} files, {format_size(size)} "
+        f"compressed to {format_size(os.path.getsize(archive))} "
+        f"({size / seconds / 1024 / 1024:.1f} MB/s)"
+    )
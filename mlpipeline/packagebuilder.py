@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import os
 import pathlib
-import pdb
-import shutil
 import subprocess
 
-import yaml
-
 from .globals import PIPELINES_FOLDER
+from .importgraph import notebooks_modules
+from .notebookscanner import extract_notebooks
+from .packagemanifest import PackageManifest, format_size
 from .pipelinebuilder import pipeline_steps
-from .reportbuilder import report_steps
+from .reportbuilder import RunnersWorkflows, report_steps
+from .yamlio import load_yaml
+
+# Files of the data folder always copied to the package, never linked
+UNLINKED_DATA_FILES = (".dvc", ".gitignore")
 
 
 class PackageBuilder:
@@ -24,35 +27,55 @@ class PackageBuilder:
         """Copy the requirements.txt or the setup_env folder from the current directory to the directory
         of the git repository
         """
-        # if the setup_env folder or requirements.txt exists inside the subfolder delete it
-        # first and then copy the new one
-        if pathlib.Path(
-            f"{PIPELINES_FOLDER}/{self.__subfolder}/setup_env"
-        ).exists():
-            shutil.rmtree(f"{PIPELINES_FOLDER}/{self.__subfolder}/setup_env")
-
-        if pathlib.Path(
-            f"{PIPELINES_FOLDER}/{self.__subfolder}/requirements.txt"
-        ).exists():
-            os.remove(
-                f"{PIPELINES_FOLDER}/{self.__subfolder}/requirements.txt"
-            )
-
+        # the previous setup_env folder or requirements.txt of the package
+        # is removed by the manifest when it isn't copied anymore
         if pathlib.Path("./setup_env").exists():
-            shutil.copytree(
-                "./setup_env",
-                f"{PIPELINES_FOLDER}/{self.__subfolder}/setup_env",
-            )
+            self.__manifest.add_folder("./setup_env", "setup_env")
         elif pathlib.Path("./requirements.txt").exists():
-            shutil.copy(
-                "requirements.txt",
-                f"{PIPELINES_FOLDER}/{self.__subfolder}/requirements.txt",
-            )
+            self.__manifest.add_file("requirements.txt", "requirements.txt")
         else:
             raise Exception("No requirements.txt or setup_env folder found")
 
-    def __copy_data_folder(self):
-        """Copy the data folder to the git repo"""
+    def __filter_data_files(self, file_paths: list[str], data: dict):
+        """Keep the data files the stages of the pipeline depend on, their
+        .dvc files and the .gitignore files of their folders
+
+        Parameters
+        ----------
+        file_paths: list[str]
+            paths of the data files relative to the root of the project
+        data: dict
+            content of the dvc.yaml file of the main project
+        """
+
+        # The dependencies are relative to the working directory of the stage
+        deps = set(
+            os.path.normpath(os.path.join(stage.get("wdir", "."), dep))
+            for stage in data["stages"].values()
+            for dep in stage.get("deps", [])
+        )
+
+        def is_needed(path: str) -> bool:
+            if os.path.basename(path) == ".gitignore":
+                folder = os.path.dirname(path)
+                return any(dep.startswith(folder + "/") for dep in deps)
+            return any(
+                path in [dep, dep + ".dvc"] or path.startswith(dep + "/")
+                for dep in deps
+            )
+
+        return [path for path in file_paths if is_needed(path)]
+
+    def __copy_data_folder(self, data: dict = None, sparse: bool = False):
+        """Copy the data folder to the git repo
+
+        Parameters
+        ----------
+        data: dict
+            content of the dvc.yaml file of the main project, if already read
+        sparse: bool
+            copy only the data files the stages of the pipeline depend on
+        """
 
         # Run the git ls-files command and capture the output
         output = subprocess.check_output(
@@ -72,8 +95,10 @@ class PackageBuilder:
         # Remove any empty elements from the list
         file_paths = [path for path in file_paths if path]
 
-        # Specify the destination folder where we want to copy the files
-        destination_folder = f"{PIPELINES_FOLDER}/{self.__subfolder}"
+        if sparse:
+            if data is None:
+                data = load_yaml("dvc.yaml")
+            file_paths = self.__filter_data_files(file_paths, data)
 
         # Get the root path of the Git repository
         git_root = (
@@ -82,19 +107,15 @@ class PackageBuilder:
             .strip()
         )
 
-        # Copy each file to the destination folder
+        # Add each file to the package
         for file_path in file_paths:
             # Construct the complete source file path
             source_file_path = os.path.join(git_root, file_path)
 
-            # Construct the destination file path
-            destination_file_path = os.path.join(destination_folder, file_path)
-
-            # Create the destination folder if it doesn't exist
-            os.makedirs(os.path.dirname(destination_file_path), exist_ok=True)
-
-            # Copy the file to the destination folder
-            shutil.copy(source_file_path, destination_file_path)
+            # dvc rewrites the .dvc and .gitignore files in place, a link
+            # would write them in the main project too
+            link = not file_path.endswith(UNLINKED_DATA_FILES)
+            self.__manifest.add_file(source_file_path, file_path, link=link)
 
         # LEGACY: old code to copy the data folder to the git repo
         # shutil.copytree(
@@ -119,12 +140,18 @@ class PackageBuilder:
         )
         os.makedirs(c, exist_ok=True)
 
-    def __copy_dependencies(self):
-        """Copy the dependencies of the pipeline to the git repository"""
+    def __copy_dependencies(self, data: dict = None):
+        """Copy the dependencies of the pipeline to the git repository
+
+        Parameters
+        ----------
+        data: dict
+            content of the dvc.yaml file of the main project, if already read
+        """
 
         # Open the dvc.yaml file
-        with open("dvc.yaml", "r") as dvc_f:
-            data = yaml.safe_load(dvc_f)
+        if data is None:
+            data = load_yaml("dvc.yaml")
 
         # get the dependencies of the pipeline
         unique_deps = set(
@@ -160,106 +187,182 @@ class PackageBuilder:
                 # if the dependency doesn't starts with .. it means that it is inside the notebooks folder
                 if not dep.startswith(".."):
                     dep = f"./notebooks/{dep}"
-
-                    # create the folder
-                    os.makedirs(
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/notebooks/{dep_url}",
-                        exist_ok=True,
-                    )
-                    # copy the dependency
-                    shutil.copy(
-                        dep,
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/notebooks/{dep_url}/{dep_name}",
+                    # add the dependency
+                    self.__manifest.add_file(
+                        dep, f"notebooks/{dep_url}/{dep_name}", link=True
                     )
                 else:
                     # remove the first two dots
                     dep_url = dep_url[3:]
                     dep = dep[3:]
-                    os.makedirs(
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/{dep_url}",
-                        exist_ok=True,
-                    )
-                    # copy the dependency
-                    shutil.copy(
-                        dep,
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/{dep_url}/{dep_name}",
+                    # add the dependency
+                    self.__manifest.add_file(
+                        dep, f"{dep_url}/{dep_name}", link=True
                     )
             else:
                 # if the dependency doesn't starts with .. it means that it is inside the notebooks folder
                 if not dep.startswith(".."):
                     dep = f"./notebooks/{dep}"
-                    # copy the folder to the pipeline folder
-                    shutil.copytree(
-                        dep,
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/{dep}",
-                        dirs_exist_ok=True,
-                    )
                 else:
                     # remove the first two dots
                     dep = dep[3:]
-                    # copy the folder dependency
-                    shutil.copytree(
-                        dep,
-                        os.getcwd()
-                        + "/"
-                        + f"{PIPELINES_FOLDER}/{self.__subfolder}/{dep}",
-                        dirs_exist_ok=True,
-                    )
+                # add the folder dependency
+                self.__add_folder_dependency(dep)
 
             print("Copied dependency: " + dep)
 
+    def __add_folder_dependency(self, dep: str):
+        """Add a folder dependency to the package, only with the modules the
+        notebooks import when the dependencies are pruned
+
+        Parameters
+        ----------
+        dep: str
+            path of the folder
+        """
+
+        if not self.__prune_deps:
+            self.__manifest.add_folder(dep, dep, link=True)
+            return
+
+        # The modules are imported from the folder of the notebooks, the
+        # dependency or its parent
+        roots = sorted(
+            set(
+                os.path.dirname(notebook) or "."
+                for notebook in self.__notebooks
+            )
+        ) + [dep, os.path.dirname(os.path.normpath(dep)) or "."]
+        try:
+            modules = notebooks_modules(self.__notebooks, roots)
+        except (SyntaxError, UnicodeDecodeError) as e:
+            print(f"Could not read the imports of the notebooks: {e}")
+            self.__manifest.add_folder(dep, dep, link=True)
+            return
+
+        # The other files of the folder may be read by the modules
+        skipped = self.__manifest.add_folder(
+            dep,
+            dep,
+            link=True,
+            keep=lambda path: "__pycache__" not in path.split(os.sep)
+            and (
+                not path.endswith(".py") or os.path.normpath(path) in modules
+            ),
+        )
+        print(
+            f"Pruned dependency: {dep} ({len(skipped)} files, "
+            f"{format_size(sum(os.path.getsize(path) for path in skipped))})"
+        )
+
     def __copy_gitignore(self):
         """Copy the .gitignore file from the current directory to
         the new repository
         """
 
-        shutil.copy(
+        self.__manifest.add_file(
             os.path.join(os.path.dirname(__file__), "resources/.gitignore"),
-            f"{PIPELINES_FOLDER}/{self.__subfolder}/.gitignore",
+            ".gitignore",
         )
 
-    def copy_all(self, notebooks: list[str], subfolder: str = None):
-        """Copy the notebooks, requirements, data, dependencies, and gitignore files
-        to the git repo
+    def collect(
+        self,
+        notebooks: list[str],
+        subfolder: str,
+        dvc: dict = None,
+        link_mode: str = "copy",
+        sparse: bool = False,
+        prune_deps: bool = False,
+    ) -> PackageManifest:
+        """Collect the notebooks, requirements, data, dependencies, and
+        gitignore files of the package without copying them
 
         Parameters
         ----------
         *notebooks: tuple
             name of the notebooks
+        subfolder: str
+            name of the pipeline folder of the package
+        dvc: dict
+            content of the dvc.yaml file of the main project, if already read
+        link_mode: str
+            how the data and dependencies are put in the package: copy,
+            hardlink, reflink or symlink
+        sparse: bool
+            copy only the data files the stages of the pipeline depend on
+        prune_deps: bool
+            copy only the modules of the folder dependencies imported by the
+            notebooks
         """
 
         self.__subfolder = subfolder
-        self.__create_init_folder()
-        self.__create_folder("notebooks")
-        self.__create_folder("outputs")
+        self.__notebooks = notebooks
+        self.__prune_deps = prune_deps
+        # Only the new and changed files are copied to the package
+        self.__manifest = PackageManifest(subfolder, link_mode=link_mode)
         self.__copy_requirements()
-        self.__copy_data_folder()
-        self.__copy_dependencies()
+        self.__copy_data_folder(dvc, sparse)
+        self.__copy_dependencies(dvc)
         self.__copy_gitignore()
 
         # Copy the notebooks of the pipeline
         for notebook in notebooks:
             # Copy the notebooks of the pipeline
-            shutil.copy(
-                notebook, f"{PIPELINES_FOLDER}/{self.__subfolder}/notebooks"
+            self.__manifest.add_file(
+                notebook, f"notebooks/{os.path.basename(notebook)}"
             )
             print("Copied notebook: " + notebook)
 
+        return self.__manifest
+
+    def copy_all(
+        self,
+        notebooks: list[str],
+        subfolder: str,
+        dvc: dict = None,
+        link_mode: str = "copy",
+        sparse: bool = False,
+        prune_deps: bool = False,
+    ):
+        """Copy the notebooks, requirements, data, dependencies, and gitignore files
+        to the git repo
 
-package = PackageBuilder()
-
+        Parameters
+        ----------
+        *notebooks: tuple
+            name of the notebooks
+        dvc: dict
+            content of the dvc.yaml file of the main project, if already read
+        link_mode: str
+            how the data and dependencies are put in the package: copy,
+            hardlink, reflink or symlink
+        sparse: bool
+            copy only the data files the stages of the pipeline depend on
+        prune_deps: bool
+            copy only the modules of the folder dependencies imported by the
+            notebooks
+        """
 
-def setup_package(notebooks: list[str], subfolder: str):
+        self.__subfolder = subfolder
+        self.__create_init_folder()
+        self.__create_folder("notebooks")
+        self.__create_folder("outputs")
+        manifest = self.collect(
+            notebooks, subfolder, dvc, link_mode, sparse, prune_deps
+        )
+        manifest.sync(f"{PIPELINES_FOLDER}/{subfolder}")
+
+
+def setup_package(
+    notebooks: list[str],
+    subfolder: str,
+    specs: list[dict] = None,
+    runners: RunnersWorkflows | None = None,
+    dvc: dict = None,
+    link_mode: str = "copy",
+    sparse: bool = False,
+    prune_deps: bool = False,
+):
     """Copy the notebooks, requirements, data, dependencies, and gitignore files
     to the git repo
     Parameters
@@ -268,8 +371,28 @@ def setup_package(notebooks: list[str], subfolder: str):
         name of the notebooks
     subfolder: str
         name of the subfolder where the pipeline are located
+    specs: list[dict]
+        specs already extracted from the notebooks, if any
+    runners: RunnersWorkflows | None
+        runners workflows shared with the other pipelines, if any
+    dvc: dict
+        content of the dvc.yaml file of the main project, if already read
+    link_mode: str
+        how the data and dependencies are put in the package: copy,
+        hardlink, reflink or symlink
+    sparse: bool
+        copy only the data files the stages of the pipeline depend on
+    prune_deps: bool
+        copy only the modules of the folder dependencies imported by the
+        notebooks
     """
 
-    package.copy_all(notebooks, subfolder)
-    pipeline_steps(notebooks, subfolder)
-    report_steps(notebooks, subfolder)
+    package = PackageBuilder()
+    package.copy_all(notebooks, subfolder, dvc, link_mode, sparse, prune_deps)
+
+    # Read the packaged notebooks once for both the pipeline and the report
+    if specs is None:
+        specs = extract_notebooks(notebooks, subfolder)
+
+    pipeline_steps(notebooks, subfolder, specs)
+    report_steps(notebooks, subfolder, specs, runners)
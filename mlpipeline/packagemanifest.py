@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import errno
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import uuid
+from types import ModuleType
+from typing import Callable
+
+from .artifacts import write_file
+from .bulkcopy import copy_file, copy_files
+from .globals import MANIFESTS_FOLDER
+
+# fcntl is missing on windows
+fcntl: ModuleType | None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Version of the manifests, bump it when the format of the manifests changes
+MANIFEST_VERSION = 1
+# Size of the chunks read when hashing and copying the files
+CHUNK_SIZE = 1024 * 1024
+# Ways of putting the data files in a package, the files that can't be
+# linked are copied
+LINK_MODES = ["copy", "hardlink", "reflink", "symlink"]
+# ioctl cloning a file on the filesystems supporting it (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def format_size(size: int) -> str:
+    """Format a number of bytes for the user
+
+    Parameters
+    ----------
+    size: int
+        number of bytes
+    """
+
+    value = float(size)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if value < 1024 or unit == "GB":
+            break
+        value /= 1024
+    return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+
+
+def hash_file(path: str) -> str:
+    """Compute the content hash of a file
+
+    Parameters
+    ----------
+    path: str
+        path of the file
+    """
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def copy_file_with_hash(src: str, dst: str) -> str:
+    """Copy a file with its permissions and return its content hash, the
+    destination is replaced atomically
+
+    Parameters
+    ----------
+    src: str
+        path of the source file
+    dst: str
+        path of the destination file, its folder must exist
+    """
+
+    # The file is hashed first so the copy reads it from the page cache
+    fingerprint = hash_file(src)
+    copy_file(src, dst)
+    return fingerprint
+
+
+def link_file(src: str, dst: str, mode: str) -> bool:
+    """Link a file instead of copying it, the destination is replaced
+    atomically. Returns False if the filesystem can't link the file
+
+    Parameters
+    ----------
+    src: str
+        path of the source file
+    dst: str
+        path of the destination file
+    mode: str
+        hardlink, reflink or symlink
+    """
+
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp_path = os.path.join(
+        os.path.dirname(dst) or ".",
+        f".{os.path.basename(dst)}.{uuid.uuid4().hex}.tmp",
+    )
+    try:
+        if mode == "hardlink":
+            os.link(src, tmp_path)
+        elif mode == "symlink":
+            # Relative to the package so the project can be moved
+            os.symlink(
+                os.path.relpath(src, os.path.dirname(dst) or "."), tmp_path
+            )
+        else:
+            if fcntl is None:
+                return False
+            with open(src, "rb") as src_f, open(tmp_path, "wb") as dst_f:
+                fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+            shutil.copymode(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except OSError:
+        # Other filesystem, links not permitted or no copy on write
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+class PackageManifest:
+    """Class to copy the files of a pipeline package incrementally, the
+    manifest keeps the state of each file copied in the package"""
+
+    # A file is copied again only if it is new, if its source changed
+    # (size or mtime, then content hash) or if its copy was modified.
+    # The files copied by a previous sync that are not part of the package
+    # anymore are removed from it.
+    # The files added with link are linked instead of copied with the
+    # hardlink, reflink and symlink modes, the hardlinks and symlinks share
+    # the content of the source so they mustn't be modified in place
+
+    def __init__(
+        self,
+        pipeline: str,
+        folder: str = MANIFESTS_FOLDER,
+        link_mode: str = "copy",
+    ):
+        self.__pipeline = pipeline
+        self.__path = pathlib.Path(folder) / f"{pipeline}.json"
+        self.__link_mode = link_mode
+        # Files of the package: destination relative to the package ->
+        # source and whether it can be linked
+        self.__files: dict[str, tuple[str, bool]] = {}
+
+    def add_file(self, src: str, dst: str, link: bool = False):
+        """Add a file to the package
+
+        Parameters
+        ----------
+        src: str
+            path of the source file
+        dst: str
+            path of the file relative to the package folder
+        link: bool
+            link the file with the link mode instead of copying it
+        """
+
+        self.__files[os.path.normpath(dst)] = (os.path.normpath(src), link)
+
+    def add_folder(
+        self,
+        src: str,
+        dst: str,
+        link: bool = False,
+        keep: Callable[[str], bool] | None = None,
+    ) -> list[str]:
+        """Add the files of a folder to the package, returns the paths of
+        the files that weren't kept
+
+        Parameters
+        ----------
+        src: str
+            path of the source folder
+        dst: str
+            path of the folder relative to the package folder
+        link: bool
+            link the files with the link mode instead of copying them
+        keep: Callable[[str], bool] | None
+            function telling if a file of the folder is added, all the files
+            are added if None
+        """
+
+        if not os.path.isdir(src):
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), src
+            )
+
+        skipped = []
+        for root, dirs, files in os.walk(src):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                if keep is not None and not keep(file_path):
+                    skipped.append(file_path)
+                    continue
+                self.add_file(
+                    file_path,
+                    os.path.join(dst, os.path.relpath(file_path, src)),
+                    link,
+                )
+        return skipped
+
+    def files(self) -> dict[str, str]:
+        """Get the files of the package: path relative to the package folder
+        -> path of the source file"""
+
+        return {dst: src for dst, (src, _) in self.__files.items()}
+
+    def __load(self) -> dict:
+        """Load the entries of the manifest, empty if there is none"""
+
+        try:
+            with open(self.__path, "r") as manifest_f:
+                manifest = json.load(manifest_f)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest["files"]
+
+    @staticmethod
+    def __copy(src: str, dst: str, mode: str) -> tuple:
+        """Copy or link a file of the package, returns its size and its
+        content hash, None for the linked files"""
+
+        # The files that can't be linked are copied, the mode is kept so
+        # they aren't copied again by the next sync
+        if mode != "copy" and link_file(src, dst, mode):
+            return os.path.getsize(src), None
+        return os.path.getsize(src), copy_file_with_hash(src, dst)
+
+    @staticmethod
+    def __entry(
+        src: str, dst: str, mode: str, fingerprint: str | None
+    ) -> dict:
+        """Entry of a file of the package in the manifest"""
+
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+        return {
+            "src": src,
+            "size": src_stat.st_size,
+            "mtime": src_stat.st_mtime_ns,
+            "hash": fingerprint,
+            "mode": mode,
+            "dst_size": dst_stat.st_size,
+            "dst_mtime": dst_stat.st_mtime_ns,
+        }
+
+    def sync(self, package_folder: str) -> dict:
+        """Copy the new and changed files to the package, remove the files
+        that are not part of it anymore and save the manifest
+
+        Parameters
+        ----------
+        package_folder: str
+            folder of the package
+        """
+
+        previous = self.__load()
+        entries = {}
+        summary = {
+            "copied": 0,
+            "copied_bytes": 0,
+            "skipped": 0,
+            "skipped_bytes": 0,
+            "removed": 0,
+        }
+
+        # Files to copy or link: source, destination and mode
+        outdated = []
+        outdated_files = []
+        for dst, (src, link) in self.__files.items():
+            dst_path = os.path.join(package_folder, dst)
+            src_stat = os.stat(src)
+            entry = previous.get(dst)
+            mode = self.__link_mode if link else "copy"
+
+            # The copy is up to date if it wasn't modified since the last
+            # sync and the source didn't change (same stat or same content)
+            up_to_date = False
+            fingerprint = None
+            if entry and [entry["src"], entry.get("mode", "copy")] == [
+                src,
+                mode,
+            ]:
+                fingerprint = entry["hash"]
+                try:
+                    dst_stat = os.stat(dst_path)
+                except FileNotFoundError:
+                    dst_stat = None
+
+                if dst_stat and [dst_stat.st_size, dst_stat.st_mtime_ns] == [
+                    entry["dst_size"],
+                    entry["dst_mtime"],
+                ]:
+                    if [src_stat.st_size, src_stat.st_mtime_ns] == [
+                        entry["size"],
+                        entry["mtime"],
+                    ]:
+                        up_to_date = True
+                    # The linked files aren't hashed, linking them again
+                    # is cheaper
+                    elif src_stat.st_size == entry["size"] and fingerprint:
+                        up_to_date = hash_file(src) == fingerprint
+
+            if not up_to_date:
+                outdated.append((src, dst_path, mode))
+                outdated_files.append(dst)
+                continue
+
+            summary["skipped"] += 1
+            summary["skipped_bytes"] += src_stat.st_size
+            entries[dst] = self.__entry(src, dst_path, mode, fingerprint)
+
+        # The outdated files are copied concurrently
+        results, stats = copy_files(outdated, self.__copy)
+        for dst, (src, dst_path, mode), (size, fingerprint) in zip(
+            outdated_files, outdated, results
+        ):
+            summary["copied"] += 1
+            summary["copied_bytes"] += size
+            entries[dst] = self.__entry(src, dst_path, mode, fingerprint)
+
+        # Remove the files copied by a previous sync that vanished
+        for dst in previous:
+            if dst not in entries:
+                pathlib.Path(package_folder, dst).unlink(missing_ok=True)
+                summary["removed"] += 1
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(
+            str(self.__path),
+            json.dumps({"version": MANIFEST_VERSION, "files": entries}),
+            verbose=False,
+        )
+
+        print(
+            f"{self.__pipeline} package: "
+            f"{summary['copied']} files copied "
+            f"({format_size(summary['copied_bytes'])}), "
+            f"{summary['skipped']} files unchanged "
+            f"({format_size(summary['skipped_bytes'])}), "
+            f"{summary['removed']} files removed"
+            + (f" ({stats})" if summary["copied"] else "")
+        )
+        return summary
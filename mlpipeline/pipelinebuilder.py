@@ -1,13 +1,26 @@
 from __future__ import annotations
 
-import io
+import copy
 import pathlib
-import shutil
-
-import yaml
-from nbformat import read
 
+from .artifacts import copy_file, dump_yaml
 from .globals import PIPELINES_FOLDER
+from .notebookscanner import extract_notebooks, replay_calls
+
+
+def convert_dict_keys_to_list_recursive(dict_input):
+    for key, value in dict_input.items():
+        if isinstance(value, list):
+            if all(isinstance(item, list) for item in value):
+                for item in value:
+                    convert_dict_keys_to_list_recursive({key: item})
+            else:
+                dict_input[key] = {"list": {key: value}}
+        elif isinstance(value, dict):
+            dict_input[key] = convert_dict_keys_to_list_recursive(value)
+        else:
+            continue
+    return dict_input
 
 
 class PipelineBuilder:
@@ -139,38 +152,48 @@ class PipelineBuilder:
         self.__check_dvc_stage(stage)
         self.__dvc_stages[stage]["cmd"] = cmd
 
-    def set_notebooks(self, notebooks: list[str], subfolder: str = None):
+    def get_dvc_stages(self) -> dict:
+        """Get the dvc stages built from the notebooks"""
+
+        return self.__dvc_stages
+
+    def get_params(self) -> dict:
+        """Get the params built from the notebooks as they are saved
+        in a new params.yaml file"""
+
+        return convert_dict_keys_to_list_recursive(
+            copy.deepcopy(self.__params)
+        )
+
+    def set_notebooks(
+        self,
+        notebooks: list[str],
+        subfolder: str = None,
+        specs: list[dict] = None,
+        save: bool = True,
+    ):
         """Add notebooks used in the pipeline
 
         Parameters
         ----------
         *notebooks: tuple
             name of the notebooks
+        specs: list[dict]
+            specs already extracted from the notebooks, if any
+        save: bool
+            save the pipeline files, otherwise the pipeline is only built
         """
         self.__clear_all_variables()
-        for notebook in notebooks:
-            # Import the jupyter notebook
-            if subfolder:
-                notebook = f"{PIPELINES_FOLDER}/{subfolder}/{notebook}"
-
-            try:
-                with io.open(notebook, "r", encoding="utf-8") as f:
-                    nb = read(f, 4)
+        if specs is None:
+            specs = extract_notebooks(notebooks, subfolder)
 
-                # Look for the pipeline methods inside the notebook's cells
-                cells = list(
-                    filter(lambda cell: "pipeline." in cell.source, nb.cells)
-                )
-
-                # Execute the pipeline methods
-                for cell in cells:
-                    exec(cell.source)
-            except FileNotFoundError:
-                print(f"File {notebook} not found!")
-                raise
+        # Execute the pipeline methods called inside the notebook's cells
+        for spec in specs:
+            replay_calls(self, spec["pipeline"])
 
         # Save the pipeline to get the yaml files needed for DVC to run
-        self.__save_pipeline(subfolder)
+        if save:
+            self.__save_pipeline(subfolder)
 
     def set_pipeline_stage(
         self, stage: str, notebook_name: str, output_name: str, params: dict
@@ -205,22 +228,6 @@ class PipelineBuilder:
     def __save_pipeline(self, subfolder: str = None):
         """Save the pipeline to their respective files"""
 
-        def convert_dict_keys_to_list_recursive(dict_input):
-            for key, value in dict_input.items():
-                if isinstance(value, list):
-                    if all(isinstance(item, list) for item in value):
-                        for item in value:
-                            convert_dict_keys_to_list_recursive({key: item})
-                    else:
-                        dict_input[key] = {"list": {key: value}}
-                elif isinstance(value, dict):
-                    dict_input[key] = convert_dict_keys_to_list_recursive(
-                        value
-                    )
-                else:
-                    continue
-            return dict_input
-
         def save_dvc():
             dvc_yml = "dvc.yaml"
 
@@ -228,8 +235,7 @@ class PipelineBuilder:
                 dvc_yml = f"{PIPELINES_FOLDER}/{subfolder}/{dvc_yml}"
 
             # Save the dvc.yaml file in the root directory
-            with open(dvc_yml, "w") as dvc_f:
-                yaml.dump({"stages": self.__dvc_stages}, dvc_f)
+            dump_yaml(dvc_yml, {"stages": self.__dvc_stages})
 
         def save_params():
             params_yml = "params.yaml"
@@ -242,22 +248,20 @@ class PipelineBuilder:
                 # if not, create it with the data from the pipeline
                 if not pathlib.Path(params_yml).exists():
                     # Save the params.yaml file in the root directory
-                    with open(params_yml, "w") as params_f:
-                        yaml.dump(
-                            convert_dict_keys_to_list_recursive(self.__params),
-                            params_f,
-                        )
+                    dump_yaml(
+                        params_yml,
+                        convert_dict_keys_to_list_recursive(self.__params),
+                    )
 
                     # Save the params.yaml file in the working directory
-                    with open(wdir_params_yml, "w") as wdir_params_f:
-                        yaml.dump(
-                            convert_dict_keys_to_list_recursive(self.__params),
-                            wdir_params_f,
-                        )
+                    dump_yaml(
+                        wdir_params_yml,
+                        convert_dict_keys_to_list_recursive(self.__params),
+                    )
                 # If params.yml has changed (i.e by a DS),
                 # copy the old one in the working directory to sync both files
                 else:
-                    shutil.copyfile(params_yml, wdir_params_yml)
+                    copy_file(params_yml, wdir_params_yml)
 
             # Pipeline params
             else:
@@ -270,9 +274,9 @@ class PipelineBuilder:
                 # copy the params.yaml from the root directory to the pipeline directory
                 # then sync it with the one in the working directory
                 if not pathlib.Path(params_yml).exists():
-                    shutil.copyfile("params.yaml", params_yml)
+                    copy_file("params.yaml", params_yml)
 
-                shutil.copyfile(params_yml, wdir_params_yml)
+                copy_file(params_yml, wdir_params_yml)
 
         save_dvc()
         save_params()
@@ -282,8 +286,18 @@ class PipelineBuilder:
         )
 
 
+# Instance for the notebooks importing it, the builds use their own instances
 pipeline = PipelineBuilder()
 
 
-def pipeline_steps(notebooks: list[str], subfolder: str = None):
-    pipeline.set_notebooks(notebooks, subfolder=subfolder)
+def pipeline_steps(
+    notebooks: list[str],
+    subfolder: str = None,
+    specs: list[dict] = None,
+    save: bool = True,
+) -> PipelineBuilder:
+    builder = PipelineBuilder()
+    builder.set_notebooks(
+        notebooks, subfolder=subfolder, specs=specs, save=save
+    )
+    return builder
@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing, contextmanager
+
+from .globals import DEFAULT_PIPELINE, PIPELINES_FOLDER
+from .locks import get_lock
+from .utils import get_notebooks_from_str
+
+# Registry of the pipelines and of the notebooks linked to them
+REGISTRY_PATH = f"{PIPELINES_FOLDER}/pipelines.db"
+# Registry of the previous versions, migrated to the sqlite registry
+JSON_REGISTRY_PATH = f"{PIPELINES_FOLDER}/pipelines.json"
+# Version of the registry schema, bump it when the tables change
+REGISTRY_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE pipelines (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE notebooks (
+    pipeline_id INTEGER NOT NULL
+        REFERENCES pipelines (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (pipeline_id, position)
+) WITHOUT ROWID;
+CREATE INDEX notebooks_path ON notebooks (path);
+CREATE TABLE default_pipeline (
+    slot INTEGER PRIMARY KEY CHECK (slot = 0),
+    name TEXT NOT NULL
+);
+"""
+
+
+class PipelineRegistry:
+    """Class to store the pipelines, their notebooks and the default pipeline
+    in a sqlite database"""
+
+    # The pipelines are listed in the order they were created, their notebooks
+    # in the order they were linked. Each lookup and update goes through the
+    # indexes of the tables instead of loading the whole registry.
+    # The pipelines.json file of the previous versions is migrated to the
+    # database the first time the registry is opened
+
+    def __init__(
+        self,
+        path: str = REGISTRY_PATH,
+        json_path: str = JSON_REGISTRY_PATH,
+    ):
+        self.__path = pathlib.Path(path)
+        self.__json_path = pathlib.Path(json_path)
+
+    def exists(self) -> bool:
+        """Check if the registry was created"""
+
+        return self.__path.exists() or self.__json_path.exists()
+
+    def __create(self):
+        """Create the database with the pipelines of the json registry if
+        any, the database is replaced atomically"""
+
+        pipelines = {}
+        if self.__json_path.exists():
+            with open(self.__json_path, "r") as pipelines_f:
+                pipelines = json.load(pipelines_f)
+
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.__path.parent,
+            prefix=f".{self.__path.name}.",
+            suffix=".tmp",
+        )
+        os.close(fd)
+        try:
+            with closing(sqlite3.connect(tmp_path)) as conn:
+                conn.executescript(SCHEMA)
+                conn.execute(f"PRAGMA user_version = {REGISTRY_VERSION}")
+                with conn:
+                    for name, notebooks in pipelines.items():
+                        if name == DEFAULT_PIPELINE:
+                            self.__set_default(conn, notebooks or "")
+                        else:
+                            self.__link(
+                                conn,
+                                name,
+                                get_notebooks_from_str(notebooks or ""),
+                            )
+            os.replace(tmp_path, self.__path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # The database holds the pipelines of the json registry now
+        self.__json_path.unlink(missing_ok=True)
+
+    @contextmanager
+    def __transaction(self):
+        """Open a connection to the database, the changes are committed when
+        the block succeeds and rolled back otherwise"""
+
+        if not self.__path.exists():
+            self.__create()
+
+        with closing(sqlite3.connect(self.__path)) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != REGISTRY_VERSION:
+                raise ValueError(
+                    f"Unsupported version {version} of the registry "
+                    f"{self.__path}"
+                )
+            conn.execute("PRAGMA foreign_keys = ON")
+            with conn:
+                yield conn
+
+    @staticmethod
+    def __pipeline_id(conn: sqlite3.Connection, name: str) -> int | None:
+        """Get the id of a pipeline, None if it doesn't exist"""
+
+        row = conn.execute(
+            "SELECT id FROM pipelines WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def __link(conn: sqlite3.Connection, name: str, notebooks: list[str]):
+        """Add a pipeline if it doesn't exist and replace its notebooks"""
+
+        conn.execute(
+            "INSERT OR IGNORE INTO pipelines (name) VALUES (?)", (name,)
+        )
+        pipeline_id = PipelineRegistry.__pipeline_id(conn, name)
+        conn.execute(
+            "DELETE FROM notebooks WHERE pipeline_id = ?", (pipeline_id,)
+        )
+        conn.executemany(
+            "INSERT INTO notebooks (pipeline_id, position, path) "
+            "VALUES (?, ?, ?)",
+            [
+                (pipeline_id, position, notebook)
+                for position, notebook in enumerate(notebooks)
+            ],
+        )
+
+    @staticmethod
+    def __set_default(conn: sqlite3.Connection, name: str):
+        """Point the default pipeline to a pipeline, empty to unset it"""
+
+        conn.execute(
+            "INSERT OR REPLACE INTO default_pipeline (slot, name) "
+            "VALUES (0, ?)",
+            (name,),
+        )
+
+    def load(self) -> tuple[dict[str, list[str]], str | None]:
+        """Load the notebooks of all the pipelines, in the order the
+        pipelines were created, and the default pipeline: empty if it was
+        unset and None if it was never set"""
+
+        with self.__transaction() as conn:
+            pipelines: dict[str, list[str]] = {}
+            for name, path in conn.execute(
+                "SELECT pipelines.name, notebooks.path FROM pipelines "
+                "LEFT JOIN notebooks ON notebooks.pipeline_id = pipelines.id "
+                "ORDER BY pipelines.id, notebooks.position"
+            ):
+                pipelines.setdefault(name, [])
+                if path is not None:
+                    pipelines[name].append(path)
+
+            row = conn.execute(
+                "SELECT name FROM default_pipeline WHERE slot = 0"
+            ).fetchone()
+            return pipelines, row[0] if row else None
+
+    def update(
+        self,
+        linked: dict[str, list[str]],
+        removed: list[str],
+        default: str | None = None,
+    ) -> int:
+        """Write changes to the registry in a single transaction, the
+        removed pipelines are removed before the others are linked. Returns
+        the number of pipelines of the registry
+
+        Parameters
+        ----------
+        linked: dict[str, list[str]]
+            notebooks of the pipelines added or linked, the pipelines are
+            added if they don't exist
+        removed: list[str]
+            names of the pipelines removed with their notebooks
+        default: str
+            name of the default pipeline, empty to unset it and None to
+            keep it
+        """
+
+        with self.__transaction() as conn:
+            conn.executemany(
+                "DELETE FROM pipelines WHERE name = ?",
+                [(name,) for name in removed],
+            )
+            for name, notebooks in linked.items():
+                self.__link(conn, name, notebooks)
+            if default is not None:
+                self.__set_default(conn, default)
+            return conn.execute("SELECT COUNT(*) FROM pipelines").fetchone()[0]
+
+    def clear(self):
+        """Remove the registry with all its pipelines"""
+
+        self.__path.unlink(missing_ok=True)
+        self.__json_path.unlink(missing_ok=True)
+
+
+class RegistrySession:
+    """Class to read the registry once and write all its changes at once"""
+
+    # The registry is loaded by the first read and the reads are served from
+    # memory. The changes are kept until the session is flushed, with autoflush
+    # each change is written as soon as it is made.
+    # The session is shared by the threads of a command, like the ones syncing
+    # all the pipelines. Only the changes are written, the changes made by the
+    # other commands since the registry was loaded are kept
+
+    def __init__(
+        self, registry: PipelineRegistry = None, autoflush: bool = False
+    ):
+        self.__registry = registry or PipelineRegistry()
+        self.__autoflush = autoflush
+        self.__lock = threading.RLock()
+        self.__loaded = False
+        self.__exists = False
+        # Notebooks of the pipelines in the order they were created
+        self.__pipelines: dict[str, list[str]] = {}
+        self.__default: str | None = None
+        # Changes not written to the registry yet
+        self.__linked: dict[str, list[str]] = {}
+        self.__removed: list[str] = []
+        self.__default_changed = False
+        self.__cleared = False
+
+    def __load(self):
+        """Load the registry if it wasn't loaded yet"""
+
+        with self.__lock, get_lock("registry"):
+            if self.__loaded:
+                return
+            self.__exists = self.__registry.exists()
+            if self.__exists:
+                self.__pipelines, self.__default = self.__registry.load()
+            self.__loaded = True
+
+    def __changed(self):
+        """Write the changes if the session writes them as they are made"""
+
+        if self.__autoflush:
+            self.flush()
+
+    def exists(self) -> bool:
+        """Check if the registry was created"""
+
+        self.__load()
+        return self.__exists
+
+    def pipelines(self) -> list[str]:
+        """Get the names of the pipelines in the order they were created"""
+
+        self.__load()
+        return list(self.__pipelines)
+
+    def all_notebooks(self) -> dict[str, list[str]]:
+        """Get the notebooks of all the pipelines, in the order the pipelines
+        were created"""
+
+        self.__load()
+        return {
+            name: list(notebooks)
+            for name, notebooks in self.__pipelines.items()
+        }
+
+    def has_pipeline(self, name: str) -> bool:
+        """Check if a pipeline exists
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline
+        """
+
+        self.__load()
+        return name in self.__pipelines
+
+    def notebooks(self, name: str) -> list[str] | None:
+        """Get the notebooks linked to a pipeline, None if the pipeline
+        doesn't exist
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline
+        """
+
+        self.__load()
+        notebooks = self.__pipelines.get(name)
+        return None if notebooks is None else list(notebooks)
+
+    def get_default(self) -> str | None:
+        """Get the name of the default pipeline, empty if it was unset and
+        None if it was never set"""
+
+        self.__load()
+        return self.__default
+
+    def add_pipeline(self, name: str, default: bool = False):
+        """Add a pipeline without notebooks, the notebooks of an existing
+        pipeline are unlinked
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline
+        default: bool
+            set the pipeline as the default one
+        """
+
+        with self.__lock:
+            self.__load()
+            self.__exists = True
+            self.__pipelines[name] = []
+            self.__linked[name] = []
+            if default:
+                self.__default = name
+                self.__default_changed = True
+        self.__changed()
+
+    def link(self, name: str, notebooks: list[str]):
+        """Link notebooks to a pipeline, the pipeline is added if it doesn't
+        exist
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline
+        notebooks: list[str]
+            paths of the notebooks
+        """
+
+        with self.__lock:
+            self.__load()
+            self.__exists = True
+            self.__pipelines[name] = list(notebooks)
+            self.__linked[name] = list(notebooks)
+        self.__changed()
+
+    def remove_pipeline(self, name: str) -> bool:
+        """Remove a pipeline and its notebooks, returns False if it doesn't
+        exist
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline
+        """
+
+        with self.__lock:
+            self.__load()
+            if name not in self.__pipelines:
+                return False
+            self.__pipelines.pop(name)
+            self.__linked.pop(name, None)
+            self.__removed.append(name)
+        self.__changed()
+        return True
+
+    def set_default(self, name: str):
+        """Set the default pipeline
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline, empty to unset the default pipeline
+        """
+
+        with self.__lock:
+            self.__load()
+            self.__default = name
+            self.__default_changed = True
+        self.__changed()
+
+    def clear(self):
+        """Remove the registry with all its pipelines"""
+
+        with self.__lock:
+            self.__load()
+            # The pipelines added by other commands since the registry was
+            # loaded are kept, the registry is removed if none was added
+            self.__removed.extend(self.__pipelines)
+            self.__exists = False
+            self.__pipelines = {}
+            self.__default = None
+            self.__linked = {}
+            self.__default_changed = False
+            self.__cleared = True
+        self.__changed()
+
+    def flush(self):
+        """Write the changes made since the last flush in a single write"""
+
+        with self.__lock, get_lock("registry"):
+            if (
+                self.__linked
+                or self.__removed
+                or self.__default_changed
+                or self.__cleared
+            ):
+                remaining = self.__registry.update(
+                    self.__linked,
+                    self.__removed,
+                    self.__default if self.__default_changed else None,
+                )
+                if self.__cleared and not remaining:
+                    self.__registry.clear()
+            self.__linked = {}
+            self.__removed = []
+            self.__default_changed = False
+            self.__cleared = False
+
+
+# Session of the running command, None outside of a command
+_SESSION = None
+
+
+def get_session() -> RegistrySession:
+    """Get the registry session of the running command, outside of a command
+    the changes are written as soon as they are made"""
+
+    if _SESSION is not None:
+        return _SESSION
+    return RegistrySession(autoflush=True)
+
+
+@contextmanager
+def registry_session():
+    """Open the registry session of a command, its changes are written once
+    the command ends"""
+
+    global _SESSION
+    previous = _SESSION
+    _SESSION = RegistrySession()
+    try:
+        yield _SESSION
+    finally:
+        # The changes made before a failure are written too, they mirror the
+        # pipelines folders already created or removed
+        try:
+            _SESSION.flush()
+        finally:
+            _SESSION = previous
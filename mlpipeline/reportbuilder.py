@@ -1,26 +1,229 @@
 from __future__ import annotations
 
+import configparser
 import io
 import os
 import pathlib
 import shutil
 
-import yaml
-from nbformat import read
-
+from .artifacts import copy_file, dump_yaml, write_file
+from .bulkcopy import copy_tree
 from .globals import PIPELINES_FOLDER
+from .locks import get_lock
+from .notebookscanner import extract_notebooks, replay_calls
+from .yamlio import load_yaml
+
+# Lock the read-modify-write of the runners shared by the pipelines
+WORKFLOWS_LOCK = get_lock("workflows")
+
+# Folders of the main repo .dvc folder that aren't packaged: the cache is
+# shared with the pipelines and the tmp folder belongs to each repo
+DVC_LOCAL_FOLDERS = ["cache", "tmp"]
+# Configs of the main repo .dvc folder, the cache dir is set in the packaged
+# ones
+DVC_CONFIGS = ["config", "config.local"]
 
 DEFAULT_CMDS = "# Reproduce pipeline if any changes detected in dependencies\nmlp run_local -p main\n\n# Output the hash commit into the report\ngit log --pretty=format:'%h' -n 1 >> report.md\nprintf '\\n' >> report.md\ndvc dag --md >> report.md\nprintf '\\n' >> report.md\n\n"
 
 
+class _DvcConfigParser(configparser.ConfigParser):
+    """Parser of the dvc configs, the dvc options are case sensitive"""
+
+    def optionxform(self, optionstr: str) -> str:
+        return optionstr
+
+
+def shared_cache_config(
+    path: str, dvc_folder: str, default: bool = False
+) -> str | None:
+    """Content of a dvc config of the main repo for a pipeline, its cache
+    dir is rebased on the pipeline .dvc folder so both share the same cache
+
+    Parameters
+    ----------
+    path: str
+        path of the dvc config in the main repo
+    dvc_folder: str
+        .dvc folder of the pipeline
+    default: bool
+        set the default cache of the main repo if the config doesn't set one
+    """
+
+    config = _DvcConfigParser(interpolation=None)
+    if pathlib.Path(path).exists():
+        config.read(path)
+    elif not default:
+        return None
+
+    # The relative cache dirs are relative to the .dvc folder
+    cache_dir = config.get("cache", "dir", fallback="cache" if default else "")
+    if cache_dir and not os.path.isabs(cache_dir):
+        cache_dir = os.path.relpath(
+            os.path.join(".dvc", cache_dir), dvc_folder
+        )
+        if not config.has_section("cache"):
+            config.add_section("cache")
+        config.set("cache", "dir", pathlib.Path(cache_dir).as_posix())
+
+    content = io.StringIO()
+    config.write(content)
+    return content.getvalue()
+
+
+class RunnersWorkflows:
+    """Class to add the pipelines to the matrix and single runners
+    workflows, the workflows are loaded and written once when saved"""
+
+    # The runners workflows are shared by all the pipelines, a sync of all
+    # the pipelines adds every pipeline to the same workflows and writes them
+    # once at the end instead of once per pipeline
+
+    def __init__(self, order: list[str] = None):
+        self.__pipelines: list[str | None] = []
+        # Order of the pipelines in a serial sync, the pipelines synced
+        # concurrently are added in this order whatever their completion order
+        self.__order = order or []
+
+    def add(self, subfolder: str = None):
+        """Add a pipeline to the runners workflows
+
+        Parameters
+        ----------
+        subfolder: str
+            name of the pipeline, None for the main project which only
+            creates the workflows if they don't exist
+        """
+
+        self.__pipelines.append(subfolder)
+
+    def __add_pipeline(self, workflows: dict, subfolder: str):
+        """Add the reusable job of a pipeline to the runners workflows
+
+        Parameters
+        ----------
+        workflows: dict
+            runners workflows by name
+        subfolder: str
+            name of the pipeline
+        """
+
+        # Add the reusable pipeline job in matrix.yaml
+        data_matrix_runner_f = workflows["matrix_runner"]
+
+        data_matrix_runner_f["jobs"][subfolder] = {
+            "if": f"github.event.inputs.PIPELINE == '{subfolder}'",
+            "strategy": {
+                "matrix": {
+                    "EC2_INSTANCE_TYPE": "${{ fromJson(github.event.inputs.EC2_INSTANCE_TYPE) }}"
+                }
+            },
+            "uses": f"./.github/workflows/{subfolder}.yaml",
+            "with": {
+                "EC2_INSTANCE_TYPE": "${{ matrix.EC2_INSTANCE_TYPE }}",
+                "EC2_TARGET_SIZE": "${{ github.event.inputs.EC2_TARGET_SIZE }}",
+                "EXPERIMENT_ID": "${{ github.event.inputs.EXPERIMENT_ID }}",
+                "DATE_EXECUTION_SUBFOLDER_BOOL": "${{github.event.inputs.DATE_EXECUTION_SUBFOLDER_BOOL}}",
+            },
+            "secrets": {
+                "GH_PERSONAL_ACCESS_TOKEN": "${{ secrets.GH_PERSONAL_ACCESS_TOKEN }}"
+            },
+        }
+
+        # Add the pipeline to the options of the workflow_dispatch
+        if (
+            subfolder
+            not in data_matrix_runner_f["on"]["workflow_dispatch"]["inputs"][
+                "PIPELINE"
+            ]["options"]
+        ):
+            data_matrix_runner_f["on"]["workflow_dispatch"]["inputs"][
+                "PIPELINE"
+            ]["options"].append(subfolder)
+
+        # Add the reusable pipeline job in single.yaml
+        data_single_runner_f = workflows["single_runner"]
+
+        data_single_runner_f["jobs"][subfolder] = {
+            "if": f"github.event.inputs.PIPELINE == '{subfolder}'",
+            "uses": f"./.github/workflows/{subfolder}.yaml",
+            "with": {
+                "EC2_INSTANCE_TYPE": "${{ github.event.inputs.EC2_INSTANCE_TYPE }}",
+                "EC2_TARGET_SIZE": "${{ github.event.inputs.EC2_TARGET_SIZE }}",
+                "EXPERIMENT_ID": "${{ github.event.inputs.EXPERIMENT_ID }}",
+                "DATE_EXECUTION_SUBFOLDER_BOOL": "${{github.event.inputs.DATE_EXECUTION_SUBFOLDER_BOOL}}",
+                "EC2_INSTANCE_TYPE_SUBFOLDER_BOOL": "${{github.event.inputs.EC2_INSTANCE_TYPE_SUBFOLDER_BOOL}}",
+            },
+            "secrets": {
+                "GH_PERSONAL_ACCESS_TOKEN": "${{ secrets.GH_PERSONAL_ACCESS_TOKEN }}"
+            },
+        }
+
+        # Add the pipeline to the options of the workflow_dispatch
+        if (
+            subfolder
+            not in data_single_runner_f["on"]["workflow_dispatch"]["inputs"][
+                "PIPELINE"
+            ]["options"]
+        ):
+            data_single_runner_f["on"]["workflow_dispatch"]["inputs"][
+                "PIPELINE"
+            ]["options"].append(subfolder)
+
+    def save(self):
+        """Write the runners workflows with the added pipelines to the
+        .github/workflows folder"""
+
+        if not self.__pipelines:
+            return
+
+        # The workflows are read, updated and written by one command at a
+        # time
+        with WORKFLOWS_LOCK:
+            workflows = {}
+            for name in ["matrix_runner", "single_runner"]:
+                # check if the runner file exists inside the .github/workflows folder
+                # if it doesn't exist, create it from the template
+                if not pathlib.Path(
+                    f"./.github/workflows/{name}.yaml"
+                ).exists():
+                    runner_path = os.path.join(
+                        os.path.dirname(__file__), f"resources/{name}.yaml"
+                    )
+                else:
+                    runner_path = f"./.github/workflows/{name}.yaml"
+                workflows[name] = load_yaml(runner_path)
+
+            # Sorting is stable, the pipelines out of the order keep theirs
+            order = {name: i for i, name in enumerate(self.__order)}
+            for subfolder in sorted(
+                self.__pipelines, key=lambda name: order.get(name, len(order))
+            ):
+                if subfolder:
+                    self.__add_pipeline(workflows, subfolder)
+
+            pathlib.Path("./.github/workflows").mkdir(
+                parents=True, exist_ok=True
+            )
+            for name, workflow in workflows.items():
+                dump_yaml(
+                    f"./.github/workflows/{name}.yaml",
+                    workflow,
+                    sort_keys=False,
+                )
+        self.__pipelines = []
+
+
 class ReportBuilder:
     """Class to build the report.md file"""
 
     # Diagram of the process of building the report.md file
     # set_notebooks -> clear_all_variables -> foreach notebook: [add_text_to_report, add_comment_to_report, add_img_to_report] -> save_report
 
-    def __init__(self):
+    def __init__(self, runners: RunnersWorkflows | None = None):
         self.__report_cmds = DEFAULT_CMDS
+        # Runners workflows shared with the other builds, if any,
+        # otherwise the workflows are written with the report
+        self.__runners = runners
 
     def __clear_all_variables(self):
         self.__report_cmds = DEFAULT_CMDS
@@ -58,167 +261,106 @@ class ReportBuilder:
 
         self.__report_cmds += f"echo '![{alias}]({img_link})' >> report.md\n"
 
-    def set_notebooks(self, notebooks: list[str], subfolder: str = None):
+    def set_notebooks(
+        self,
+        notebooks: list[str],
+        subfolder: str = None,
+        specs: list[dict] = None,
+        save: bool = True,
+    ):
         """Add notebooks used in the pipeline
 
         Parameters
         ----------
         *notebooks: tuple
             name of the notebooks
+        specs: list[dict]
+            specs already extracted from the notebooks, if any
+        save: bool
+            save the report files, otherwise the report is only built
         """
 
         self.__clear_all_variables()
-        for notebook in notebooks:
-            # Import the jupyter notebook
-            if subfolder:
-                notebook = f"{PIPELINES_FOLDER}/{subfolder}/{notebook}"
-
-            try:
-                with io.open(notebook, "r", encoding="utf-8") as f:
-                    nb = read(f, 4)
-
-                # Look for the report methods inside the notebook's cells
-                cells = list(
-                    filter(lambda cell: "report." in cell.source, nb.cells)
-                )
+        if specs is None:
+            specs = extract_notebooks(notebooks, subfolder)
 
-                # Execute the report methods
-                for cell in cells:
-                    exec(cell.source)
-            except FileNotFoundError:
-                print(f"File {notebook} not found!")
-                raise
+        # Execute the report methods called inside the notebook's cells
+        for spec in specs:
+            replay_calls(self, spec["report"])
 
         # Save the report to get the yaml file needed for github action job
-        self.__save_report(subfolder)
+        if save:
+            self.__save_report(subfolder)
 
-    def __save_report(self, subfolder: str = None):
-        """Save the cml report"""
+    def __save_runners(self, subfolder: str = None):
+        """Add the pipeline to the matrix and single runners workflows"""
 
-        # If ./.github/workflows/ folder doesn't exist, create it
-        pathlib.Path("./.github/workflows").mkdir(parents=True, exist_ok=True)
+        runners = self.__runners or RunnersWorkflows()
+        runners.add(subfolder)
 
-        with open(
-            os.path.join(os.path.dirname(__file__), "resources/base.yaml"), "r"
-        ) as base_f:
-            data_self_hosted_runner = yaml.safe_load(base_f)
+        # The shared workflows are written by the owner of the runners
+        if self.__runners is None:
+            runners.save()
 
-        # Add the reusable pipeline job in matrix.yaml
+    def __save_dvc_config(self, subfolder: str):
+        """Copy the .dvc folder of the main repo to the pipeline folder
+        without its cache, the pipeline uses the cache of the main repo
 
-        # check if the matrix_runner.yaml file exists inside the .github/workflows folder
-        # if it doesn't exist, create it
-        if not pathlib.Path("./.github/workflows/matrix_runner.yaml").exists():
-            matrix_runner_path = os.path.join(
-                os.path.dirname(__file__), "resources/matrix_runner.yaml"
-            )
-        else:
-            matrix_runner_path = "./.github/workflows/matrix_runner.yaml"
-
-        with open(
-            matrix_runner_path,
-            "r",
-        ) as matrix_runner_f:
-            data_matrix_runner_f = yaml.safe_load(matrix_runner_f)
-
-            if subfolder:
-                data_matrix_runner_f["jobs"][subfolder] = {
-                    "if": f"github.event.inputs.PIPELINE == '{subfolder}'",
-                    "strategy": {
-                        "matrix": {
-                            "EC2_INSTANCE_TYPE": "${{ fromJson(github.event.inputs.EC2_INSTANCE_TYPE) }}"
-                        }
-                    },
-                    "uses": f"./.github/workflows/{subfolder}.yaml",
-                    "with": {
-                        "EC2_INSTANCE_TYPE": "${{ matrix.EC2_INSTANCE_TYPE }}",
-                        "EC2_TARGET_SIZE": "${{ github.event.inputs.EC2_TARGET_SIZE }}",
-                        "EXPERIMENT_ID": "${{ github.event.inputs.EXPERIMENT_ID }}",
-                        "DATE_EXECUTION_SUBFOLDER_BOOL": "${{github.event.inputs.DATE_EXECUTION_SUBFOLDER_BOOL}}",
-                    },
-                    "secrets": {
-                        "GH_PERSONAL_ACCESS_TOKEN": "${{ secrets.GH_PERSONAL_ACCESS_TOKEN }}"
-                    },
-                }
+        Parameters
+        ----------
+        subfolder: str
+            name of the pipeline
+        """
 
-                # Add the pipeline to the options of the workflow_dispatch
-                if (
-                    subfolder
-                    not in data_matrix_runner_f["on"]["workflow_dispatch"][
-                        "inputs"
-                    ]["PIPELINE"]["options"]
-                ):
-                    data_matrix_runner_f["on"]["workflow_dispatch"]["inputs"][
-                        "PIPELINE"
-                    ]["options"].append(subfolder)
-
-        with open(
-            "./.github/workflows/matrix_runner.yaml", "w"
-        ) as matrix_runner_f:
-            yaml.dump(
-                data_matrix_runner_f,
-                matrix_runner_f,
-                sort_keys=False,
+        dvc_folder = f"{PIPELINES_FOLDER}/{subfolder}/.dvc"
+        entries = os.listdir("./.dvc")
+
+        # Remove the cache copied by the previous versions of the package
+        if pathlib.Path(f"{dvc_folder}/cache").exists():
+            shutil.rmtree(f"{dvc_folder}/cache")
+        os.makedirs(dvc_folder, exist_ok=True)
+
+        for entry in entries:
+            if entry in DVC_LOCAL_FOLDERS:
+                continue
+
+            path = os.path.join("./.dvc", entry)
+            if os.path.isdir(path):
+                if pathlib.Path(f"{dvc_folder}/{entry}").exists():
+                    shutil.rmtree(f"{dvc_folder}/{entry}")
+                copy_tree(path, f"{dvc_folder}/{entry}")
+            elif entry not in DVC_CONFIGS:
+                copy_file(path, f"{dvc_folder}/{entry}")
+
+        # Point the configs of the pipeline to the cache of the main repo
+        for index, config in enumerate(DVC_CONFIGS):
+            content = shared_cache_config(
+                os.path.join("./.dvc", config),
+                dvc_folder,
+                # The main config sets the cache when the local one doesn't
+                index == 0,
             )
+            if content is not None:
+                write_file(f"{dvc_folder}/{config}", content)
 
-        # Add the reusable pipeline job in single.yaml
+    def get_workflow(self, subfolder: str = None) -> dict:
+        """Get the self hosted runner workflow of the report
 
-        # check if the matrix_runner.yaml file exists inside the .github/workflows folder
-        # if it doesn't exist, create it
-        if not pathlib.Path("./.github/workflows/single_runner.yaml").exists():
-            single_runner_path = os.path.join(
-                os.path.dirname(__file__), "resources/single_runner.yaml"
-            )
-        else:
-            single_runner_path = "./.github/workflows/single_runner.yaml"
-
-        with open(
-            single_runner_path,
-            "r",
-        ) as single_runner_f:
-            data_single_runner_f = yaml.safe_load(single_runner_f)
-
-            if subfolder:
-                data_single_runner_f["jobs"][subfolder] = {
-                    "if": f"github.event.inputs.PIPELINE == '{subfolder}'",
-                    "uses": f"./.github/workflows/{subfolder}.yaml",
-                    "with": {
-                        "EC2_INSTANCE_TYPE": "${{ github.event.inputs.EC2_INSTANCE_TYPE }}",
-                        "EC2_TARGET_SIZE": "${{ github.event.inputs.EC2_TARGET_SIZE }}",
-                        "EXPERIMENT_ID": "${{ github.event.inputs.EXPERIMENT_ID }}",
-                        "DATE_EXECUTION_SUBFOLDER_BOOL": "${{github.event.inputs.DATE_EXECUTION_SUBFOLDER_BOOL}}",
-                        "EC2_INSTANCE_TYPE_SUBFOLDER_BOOL": "${{github.event.inputs.EC2_INSTANCE_TYPE_SUBFOLDER_BOOL}}",
-                    },
-                    "secrets": {
-                        "GH_PERSONAL_ACCESS_TOKEN": "${{ secrets.GH_PERSONAL_ACCESS_TOKEN }}"
-                    },
-                }
+        Parameters
+        ----------
+        subfolder: str
+            name of the pipeline, None for the main project
+        """
 
-                # Add the pipeline to the options of the workflow_dispatch
-                if (
-                    subfolder
-                    not in data_single_runner_f["on"]["workflow_dispatch"][
-                        "inputs"
-                    ]["PIPELINE"]["options"]
-                ):
-                    data_single_runner_f["on"]["workflow_dispatch"]["inputs"][
-                        "PIPELINE"
-                    ]["options"].append(subfolder)
-
-        with open(
-            "./.github/workflows/single_runner.yaml", "w"
-        ) as single_runner_f:
-            yaml.dump(
-                data_single_runner_f,
-                single_runner_f,
-                sort_keys=False,
-            )
+        data_self_hosted_runner = load_yaml(
+            os.path.join(os.path.dirname(__file__), "resources/base.yaml")
+        )
 
         # Add the report commands to the GHA job for the self hosted runner
-        self.__report_cmds += "cml comment create report.md\n"
         # -2 is the index of the "Run the pipeline" step
-        data_self_hosted_runner["jobs"]["pipeline"]["steps"][-2][
-            "run"
-        ] = self.__report_cmds
+        data_self_hosted_runner["jobs"]["pipeline"]["steps"][-2]["run"] = (
+            self.__report_cmds + "cml comment create report.md\n"
+        )
 
         # Find the index of the step "Install requirements"
         # and add the setup_env command if it exists
@@ -246,44 +388,51 @@ class ReportBuilder:
 
                 break
 
-        # Setup the Pipeline folder
         if subfolder:
-            # Copy the .dvc folder from the main repo to the pipeline folder
-            # verify that the .dvc folder exists
+            # Set the name of the GHA jobs
+            data_self_hosted_runner["name"] = f"{subfolder} pipeline"
+
+            # Set the working directory for the self hosted runner to
+            # the pipeline folder
+            data_self_hosted_runner["jobs"]["pipeline"]["defaults"] = {
+                "run": {"working-directory": f"{PIPELINES_FOLDER}/{subfolder}"}
+            }
+
+        return data_self_hosted_runner
+
+    def __save_report(self, subfolder: str = None):
+        """Save the cml report"""
+
+        # If ./.github/workflows/ folder doesn't exist, create it
+        pathlib.Path("./.github/workflows").mkdir(parents=True, exist_ok=True)
+
+        data_self_hosted_runner = self.get_workflow(subfolder)
+
+        # The runners are shared by all the pipelines
+        self.__save_runners(subfolder)
 
-            # Copy the .dvc folder to the pipeline folder
-            if pathlib.Path(f"{PIPELINES_FOLDER}/{subfolder}/.dvc").exists():
-                shutil.rmtree(f"{PIPELINES_FOLDER}/{subfolder}/.dvc")
-            shutil.copytree("./.dvc", f"{PIPELINES_FOLDER}/{subfolder}/.dvc")
+        # Setup the Pipeline folder
+        if subfolder:
+            # Package the dvc config, the cache is shared with the main repo
+            self.__save_dvc_config(subfolder)
 
             # Copy the outputs folder to the pipeline folder
             if pathlib.Path(
                 f"{PIPELINES_FOLDER}/{subfolder}/outputs"
             ).exists():
                 shutil.rmtree(f"{PIPELINES_FOLDER}/{subfolder}/outputs")
-            shutil.copytree(
-                "./outputs", f"{PIPELINES_FOLDER}/{subfolder}/outputs"
-            )
+            copy_tree("./outputs", f"{PIPELINES_FOLDER}/{subfolder}/outputs")
 
             # Copy the dvc.lock file to the pipeline folder
             if pathlib.Path("./dvc.lock").exists():
-                shutil.copy(
+                copy_file(
                     "./dvc.lock", f"{PIPELINES_FOLDER}/{subfolder}/dvc.lock"
                 )
             # Copy the .dvcignore file to the pipeline folder
-            shutil.copy(
+            copy_file(
                 "./.dvcignore", f"{PIPELINES_FOLDER}/{subfolder}/.dvcignore"
             )
 
-            # Set the name of the GHA jobs
-            data_self_hosted_runner["name"] = f"{subfolder} pipeline"
-
-            # Set the working directory for the self hosted runner to
-            # the pipeline folder
-            data_self_hosted_runner["jobs"]["pipeline"]["defaults"] = {
-                "run": {"working-directory": f"{PIPELINES_FOLDER}/{subfolder}"}
-            }
-
         # Make the .github/workflows directory if it doesn't exist
         gh_workflows_path = pathlib.Path("./.github/workflows")
         if subfolder:
@@ -298,39 +447,43 @@ class ReportBuilder:
         # otherwise for a pipeline
         if not subfolder:
             # Copy the main.yaml to the main repo
-            with open(gh_workflows_path / "main.yaml", "w") as main_f:
-                yaml.dump(
-                    data_self_hosted_runner,
-                    main_f,
-                    sort_keys=False,
-                )
+            dump_yaml(
+                str(gh_workflows_path / "main.yaml"),
+                data_self_hosted_runner,
+                sort_keys=False,
+            )
         else:
             # Copy the subfolder.yaml pipeline to the subfolder repo
-            with open(
-                gh_workflows_path / f"{subfolder}.yaml", "w"
-            ) as subfolder_f:
-                yaml.dump(
-                    data_self_hosted_runner,
-                    subfolder_f,
-                    sort_keys=False,
-                )
+            dump_yaml(
+                str(gh_workflows_path / f"{subfolder}.yaml"),
+                data_self_hosted_runner,
+                sort_keys=False,
+            )
             # Copy the file to the main repo too
-            with open(
-                f"./.github/workflows/{subfolder}.yaml", "w"
-            ) as subfolder_f:
-                yaml.dump(
-                    data_self_hosted_runner,
-                    subfolder_f,
-                    sort_keys=False,
-                )
+            dump_yaml(
+                f"./.github/workflows/{subfolder}.yaml",
+                data_self_hosted_runner,
+                sort_keys=False,
+            )
 
         print(
             f"{subfolder if subfolder else 'Main'} Report saved successfully"
         )
 
 
+# Instance for the notebooks importing it, the builds use their own instances
 report = ReportBuilder()
 
 
-def report_steps(notebooks: list[str], subfolder: str = None):
-    report.set_notebooks(notebooks, subfolder=subfolder)
+def report_steps(
+    notebooks: list[str],
+    subfolder: str = None,
+    specs: list[dict] = None,
+    runners: RunnersWorkflows | None = None,
+    save: bool = True,
+) -> ReportBuilder:
+    builder = ReportBuilder(runners)
+    builder.set_notebooks(
+        notebooks, subfolder=subfolder, specs=specs, save=save
+    )
+    return builder
@@ -1,69 +1,54 @@
 import os
 import subprocess
 
-import yaml
-
+from .datapull import (
+    DEFAULT_PULL_JOBS,
+    IMPORTS_HASHES_PATH,
+    find_dvc_files,
+    pull_imports,
+)
 from .default import get_default_pipeline
 from .globals import PIPELINES_FOLDER
+from .locks import get_lock, pipeline_lock
+from .status import record_status
 from .sync import sync_pipeline
 
 RUN_PIPELINE_CMDS = ["dvc", "repro", "-f", "--no-commit", "--no-run-cache"]
 
 
-def run_local(pipeline: str):
+def run_local(pipeline: str, jobs: int = DEFAULT_PULL_JOBS):
     """Run the dvc pipeline on the main project or on the selected pipeline
 
     Parameters
         (optional) pipeline (str): name of the pipeline
+        (optional) jobs (int): number of data files pulled at the same time (default: 4)
     """
 
+    # The pipelines are run from their folder, they share the md5 of the
+    # data files computed in the main project
+    hashes_path = os.path.abspath(IMPORTS_HASHES_PATH)
+
     def find_all_dvc_files_and_pull_them():
         """Find all .dvc files in the project and pull them"""
 
-        data_folder = "data"  # Specify the path to the data folder
-        dvc_files = []
-
-        # Find all .dvc files within the data folder
-        for root, dirs, files in os.walk(data_folder):
-            for file in files:
-                if file.endswith(".dvc"):
-                    dvc_files.append(os.path.join(root, file))
-
-        # Process each .dvc file
-        for dvc_file in dvc_files:
-            # Read the contents of the .dvc file
-            with open(dvc_file, "r") as file:
-                dvc_content = yaml.safe_load(file)
-
-                s3_path = dvc_content["deps"][0]["path"]
-
-            outs_path = os.path.join(dvc_file.replace(".dvc", ""))
-
-            print(
-                "Pulling ",
-                s3_path,
-                " to ",
-                outs_path,
-            )
-
-            # Call dvc import-url with the specific S3 path and output path
-            subprocess.run(
-                [
-                    "dvc",
-                    "import-url",
-                    s3_path,
-                    outs_path,
-                ]
-            )
+        # The data files are imported by a single dvc process, the ones
+        # already up to date are skipped
+        pull_imports(find_dvc_files("data"), jobs, hashes_path=hashes_path)
 
     if pipeline == "main":
         print("Running main project...")
-        find_all_dvc_files_and_pull_them()
-        subprocess.run(RUN_PIPELINE_CMDS)
+        # The main project files are shared with the pipelines syncs
+        with get_lock("project"):
+            find_all_dvc_files_and_pull_them()
+            result = subprocess.run(RUN_PIPELINE_CMDS)
+
+            # Record the fingerprints of the stages for the status command
+            if result.returncode == 0:
+                record_status()
 
-        # Reset dvc.lock file
-        subprocess.run(["git", "reset", "--", "dvc.lock"])
-        subprocess.run(["git", "checkout", "--", "dvc.lock"])
+            # Reset dvc.lock file
+            subprocess.run(["git", "reset", "--", "dvc.lock"])
+            subprocess.run(["git", "checkout", "--", "dvc.lock"])
 
         print("Main project ran successfully")
 
@@ -77,19 +62,31 @@ def run_local(pipeline: str):
     # If a pipeline is specified OR if a default pipeline is found, run that pipeline
     if pipeline:
         print("Running pipeline", pipeline, "...")
-        sync_pipeline(pipeline)
-
-        # Change directory to the pipeline using os.chdir()
-        os.chdir(os.path.join(PIPELINES_FOLDER, pipeline))
-        find_all_dvc_files_and_pull_them()
-        subprocess.run(RUN_PIPELINE_CMDS)
-
-        path_pipeline_dvc_lock = f"./{PIPELINES_FOLDER}/{pipeline}/dvc.lock"
+        # The pipeline folder is synced and run by one command at a time
+        with pipeline_lock(pipeline):
+            sync_pipeline(pipeline)
+
+            # Change directory to the pipeline using os.chdir()
+            root = os.getcwd()
+            os.chdir(os.path.join(PIPELINES_FOLDER, pipeline))
+            try:
+                find_all_dvc_files_and_pull_them()
+                result = subprocess.run(RUN_PIPELINE_CMDS)
+            finally:
+                os.chdir(root)
+
+            # Record the fingerprints of the stages for the status command
+            if result.returncode == 0:
+                record_status(pipeline)
+
+            path_pipeline_dvc_lock = (
+                f"./{PIPELINES_FOLDER}/{pipeline}/dvc.lock"
+            )
 
-        print("Resetting dvc.lock file to the last commit...")
-        # Reset dvc.lock file
-        subprocess.run(["git", "reset", "--", path_pipeline_dvc_lock])
-        subprocess.run(["git", "checkout", "--", path_pipeline_dvc_lock])
+            print("Resetting dvc.lock file to the last commit...")
+            # Reset dvc.lock file
+            subprocess.run(["git", "reset", "--", path_pipeline_dvc_lock])
+            subprocess.run(["git", "checkout", "--", path_pipeline_dvc_lock])
 
         print("Pipeline", pipeline, "ran successfully")
 
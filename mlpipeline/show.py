@@ -1,17 +1,37 @@
-import os
+import pathlib
 
+from .dag import RENDERERS, load_dag
 from .globals import PIPELINES_FOLDER
 
 
-def show(
-    pipeline: str,
-):
-    """Show the pipeline graph in the terminal"""
+def show(pipeline: str, target: str = None, format: str = "ascii"):
+    """Show the pipeline graph in the terminal
 
-    # Run dvc dag in the correct path
+    Parameters
+    ----------
+    pipeline: str
+        name of the pipeline, the main project if not set
+    target: str
+        stage to show with the stages it depends on, all the stages if not set
+    format: str
+        format of the graph: ascii, mermaid or dot
+    """
+
+    # Build the graph in the correct path
+    folder = "."
     if pipeline:
-        stream = os.popen(f"cd {PIPELINES_FOLDER}/{pipeline} && dvc dag")
-    else:
-        stream = os.popen("dvc dag")
+        folder = f"{PIPELINES_FOLDER}/{pipeline}"
+        if not pathlib.Path(folder).exists():
+            print(f"Pipeline {pipeline} not found")
+            return
+
+    dag = load_dag(folder)
+
+    if target:
+        try:
+            dag = dag.subgraph(target)
+        except KeyError:
+            print(f"Stage {target} not found")
+            return
 
-    print(stream.read())
+    print(RENDERERS[format](dag))
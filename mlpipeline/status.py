@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+
+from .artifacts import write_file
+from .dag import Dag, load_dag
+from .globals import PIPELINES_FOLDER, STATUS_FOLDER
+from .notebookreader import read_cells
+from .yamlio import load_yaml
+
+# Version of the fingerprints files, bump it when the fingerprints change
+STATUS_VERSION = 1
+
+
+class FileHasher:
+    """Class to hash the files and folders the stages depend on, the hash of
+    a file is only computed again when its size or mtime changed"""
+
+    def __init__(self, hashes: dict = None):
+        # Hashes of the files by path: [size, mtime, hash]
+        self.hashes: dict[str, list] = {}
+        self.__previous = hashes or {}
+
+    def __hash_file(self, path: str, stat: os.stat_result) -> str:
+        """Get the content hash of a file
+
+        Parameters
+        ----------
+        path: str
+            path of the file
+        stat: os.stat_result
+            stat of the file
+        """
+
+        previous = self.__previous.get(path)
+        if previous and previous[:2] == [stat.st_size, stat.st_mtime_ns]:
+            fingerprint = previous[2]
+        else:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            fingerprint = sha256.hexdigest()
+
+        self.hashes[path] = [stat.st_size, stat.st_mtime_ns, fingerprint]
+        return fingerprint
+
+    def hash(self, path: str) -> str:
+        """Get the content hash of a file or a folder, the hash of a folder
+        is computed from the paths and the hashes of the files inside it
+
+        Parameters
+        ----------
+        path: str
+            path of the file or the folder
+        """
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return "missing"
+
+        if not os.path.isdir(path):
+            return self.__hash_file(path, stat)
+
+        sha256 = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                relative_path = os.path.relpath(file_path, path)
+                file_hash = self.__hash_file(file_path, os.stat(file_path))
+                sha256.update(f"{relative_path} {file_hash}\n".encode())
+        return sha256.hexdigest()
+
+
+def _hash_value(value) -> str:
+    """Get the hash of a json serializable value"""
+
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _stage_params(stage: dict, folder: str) -> dict:
+    """Get the values of the params sections linked to a stage
+
+    Parameters
+    ----------
+    stage: dict
+        stage of the dvc.yaml file
+    folder: str
+        folder of the project
+    """
+
+    # The params are either keys of the params.yaml file or
+    # dicts of the params file with its keys
+    keys_by_file: dict[str, list] = {}
+    for entry in stage.get("params") or []:
+        if isinstance(entry, dict):
+            for params_file, keys in entry.items():
+                keys_by_file.setdefault(params_file, []).extend(keys or [])
+        else:
+            keys_by_file.setdefault("params.yaml", []).append(entry)
+
+    wdir = os.path.join(folder, stage.get("wdir", "."))
+    values = {}
+    for params_file, keys in keys_by_file.items():
+        params_path = os.path.join(wdir, params_file)
+        params: dict = {}
+        if pathlib.Path(params_path).exists():
+            params = load_yaml(params_path) or {}
+
+        for key in keys:
+            # The keys of the nested params are separated by dots
+            # The value is a nested dict or a scalar
+            value: object = params
+            for part in str(key).split("."):
+                value = value.get(part) if isinstance(value, dict) else None
+            values[f"{params_file}:{key}"] = value
+    return values
+
+
+def _stage_notebook(stage: dict) -> str | None:
+    """Get the notebook run by the papermill command of a stage
+
+    Parameters
+    ----------
+    stage: dict
+        stage of the dvc.yaml file
+    """
+
+    # papermill <input notebook> <output notebook> ...
+    for arg in str(stage.get("cmd", "")).split():
+        if arg.endswith(".ipynb"):
+            return arg
+    return None
+
+
+def fingerprint_stages(folder: str, dag: Dag, hasher: FileHasher) -> dict:
+    """Compute the fingerprints of the stages of a project, each stage has a
+    fingerprint for its command, deps, params and notebook source
+
+    Parameters
+    ----------
+    folder: str
+        folder of the project
+    dag: Dag
+        graph of the stages of the project
+    hasher: FileHasher
+        hasher of the files the stages depend on
+    """
+
+    fingerprints = {}
+    dvc_yaml = pathlib.Path(folder) / "dvc.yaml"
+    stages: dict = {}
+    if dvc_yaml.exists():
+        stages = (load_yaml(str(dvc_yaml)) or {}).get("stages") or {}
+
+    for name, node in dag.nodes.items():
+        # The .dvc files change when the data they track is updated
+        if name not in stages:
+            fingerprints[name] = {
+                "file": hasher.hash(os.path.join(folder, name))
+            }
+            continue
+
+        stage = stages[name]
+        wdir = os.path.join(folder, stage.get("wdir", "."))
+        fingerprints[name] = {
+            "cmd": _hash_value(stage.get("cmd")),
+            "deps": _hash_value(
+                {
+                    dep: hasher.hash(os.path.join(folder, dep))
+                    for dep in node["deps"]
+                }
+            ),
+            "params": _hash_value(_stage_params(stage, folder)),
+        }
+
+        # Only the source of the cells is part of the fingerprint,
+        # running the notebook changes its outputs, not the stage
+        notebook = _stage_notebook(stage)
+        if notebook:
+            notebook_path = os.path.join(wdir, notebook)
+            fingerprints[name]["notebook"] = (
+                _hash_value(list(read_cells(notebook_path)))
+                if pathlib.Path(notebook_path).exists()
+                else "missing"
+            )
+
+    return fingerprints
+
+
+def _status_paths(pipeline: str | None, root: str) -> tuple[str, str]:
+    """Get the folder of the project and the path of its fingerprints file
+
+    Parameters
+    ----------
+    pipeline: str | None
+        name of the pipeline, the main project if not set
+    root: str
+        folder of the main project
+    """
+
+    if pipeline:
+        return (
+            os.path.join(root, PIPELINES_FOLDER, pipeline),
+            os.path.join(root, STATUS_FOLDER, f"{pipeline}.json"),
+        )
+    return root, os.path.join(root, STATUS_FOLDER, "main.json")
+
+
+def _load_status(status_path: str) -> dict:
+    """Load the fingerprints recorded for a project, empty if there are none
+
+    Parameters
+    ----------
+    status_path: str
+        path of the fingerprints file
+    """
+
+    try:
+        with open(status_path, "r") as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return {"stages": {}, "files": {}}
+
+    if recorded.get("version") != STATUS_VERSION:
+        return {"stages": {}, "files": {}}
+    return recorded
+
+
+def record_status(pipeline: str | None = None, root: str = "."):
+    """Record the fingerprints of the stages, the stages are up to date
+    until their deps, params or notebook change
+
+    Parameters
+    ----------
+    pipeline: str | None
+        name of the pipeline, the main project if not set
+    root: str
+        folder of the main project
+    """
+
+    folder, status_path = _status_paths(pipeline, root)
+    hasher = FileHasher(_load_status(status_path)["files"])
+    fingerprints = fingerprint_stages(folder, load_dag(folder), hasher)
+
+    pathlib.Path(status_path).parent.mkdir(parents=True, exist_ok=True)
+    write_file(
+        status_path,
+        json.dumps(
+            {
+                "version": STATUS_VERSION,
+                "stages": fingerprints,
+                "files": hasher.hashes,
+            }
+        ),
+        verbose=False,
+    )
+
+
+def stale_stages(
+    pipeline: str | None = None, root: str = "."
+) -> dict[str, str]:
+    """Get the stages that changed since the fingerprints were recorded and
+    the stages downstream of them, with the reason they are stale
+
+    Parameters
+    ----------
+    pipeline: str | None
+        name of the pipeline, the main project if not set
+    root: str
+        folder of the main project
+    """
+
+    folder, status_path = _status_paths(pipeline, root)
+    recorded = _load_status(status_path)
+    hasher = FileHasher(recorded["files"])
+    dag = load_dag(folder)
+    fingerprints = fingerprint_stages(folder, dag, hasher)
+
+    stale = {}
+    for name, fingerprint in fingerprints.items():
+        previous = recorded["stages"].get(name)
+        if previous is None:
+            stale[name] = "never run"
+            continue
+
+        changes = [
+            part
+            for part, value in fingerprint.items()
+            if previous.get(part) != value
+        ]
+        if changes:
+            stale[name] = f"{', '.join(changes)} changed"
+
+    # The stages depending on a stale stage are stale too, the stages are
+    # visited level by level so the whole downstream closure is found
+    predecessors = dag.predecessors()
+    levels = dag.levels()
+    for name in sorted(dag.nodes, key=lambda name: levels[name]):
+        if name in stale:
+            continue
+        upstream = [pred for pred in predecessors[name] if pred in stale]
+        if upstream:
+            stale[name] = f"downstream of {', '.join(upstream)}"
+
+    # Keep the order of the stages
+    return {name: stale[name] for name in fingerprints if name in stale}
+
+
+def status(pipeline: str | None = None):
+    """Show the stages of the main project or of a pipeline that changed
+    since they were last run
+
+    Parameters
+    ----------
+    pipeline: str | None
+        name of the pipeline, the main project if not set
+    """
+
+    if (
+        pipeline
+        and not pathlib.Path(f"{PIPELINES_FOLDER}/{pipeline}").exists()
+    ):
+        print(f"Pipeline {pipeline} not found")
+        return
+
+    stale = stale_stages(pipeline)
+    if not stale:
+        print("All stages are up to date")
+        return
+
+    for name, reason in stale.items():
+        print(f"{name}: {reason}")
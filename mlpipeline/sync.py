@@ -1,68 +1,218 @@
 from __future__ import annotations
 
-import json
 import os
 import pathlib
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+from .artifacts import copy_file, dump_yaml
+from .default import get_default_pipeline
 from .globals import PIPELINES_FOLDER
+from .locks import get_lock, pipeline_lock
+from .notebookscanner import extract_notebooks
 from .packagebuilder import setup_package
 from .pipelinebuilder import pipeline_steps
-from .reportbuilder import report_steps
-from .utils import get_default_pipeline, get_notebooks_from_str
+from .registry import get_session
+from .reportbuilder import RunnersWorkflows, report_steps
+from .utils import get_notebooks_from_str
+from .yamlio import load_yaml
 
+# Lock the main project files while a pipeline writes and reads them
+PROJECT_LOCK = get_lock("project")
 
-def sync_main_project(notebooks: list[str]):
+
+def sync_main_project(
+    notebooks: list[str],
+    specs: list[dict] = None,
+    static: bool = False,
+    jobs: int = 1,
+    runners: RunnersWorkflows | None = None,
+):
     """Creates the required files for the dvc pipeline
     ----------
     notebooks:  list[str]
         list of the notebooks
+    specs:  list[dict]
+        specs already extracted from the notebooks, if any
+    static:  bool
+        interpret the notebook's cells statically instead of executing them
+    jobs:  int
+        number of processes used to read the notebooks
+    runners:  RunnersWorkflows | None
+        runners workflows shared with the other pipelines, if any
     """
 
-    pipeline_steps(notebooks)
-    report_steps(notebooks)
+    # Read the notebooks once for both the pipeline and the report
+    if specs is None:
+        specs = extract_notebooks(notebooks, static=static, jobs=jobs)
+
+    pipeline_steps(notebooks, specs=specs)
+    report_steps(notebooks, specs=specs, runners=runners)
     print("Main Project synced")
 
 
-def sync_pipeline_project(notebooks: list[str], subfolder: str):
+def sync_pipeline_project(
+    notebooks: list[str],
+    subfolder: str,
+    static: bool = False,
+    jobs: int = 1,
+    runners: RunnersWorkflows | None = None,
+    force: bool = False,
+    main: bool = True,
+    link_mode: str = "copy",
+    sparse: bool = False,
+    prune_deps: bool = False,
+):
     """Copy the notebooks, requirements, data, dependencies, and gitignore files to the git repo
     Parameters
     ----------
     notebooks:  list[str]
         list of the notebooks
+    static:  bool
+        interpret the notebook's cells statically instead of executing them
+    jobs:  int
+        number of processes used to read the notebooks
+    runners:  RunnersWorkflows | None
+        runners workflows shared with the other pipelines, if any
+    force:  bool
+        forces creation of new params.yaml files
+    main:  bool
+        sync the main project too, otherwise its files are left untouched
+    link_mode:  str
+        how the data and dependencies are put in the package: copy,
+        hardlink, reflink or symlink
+    sparse:  bool
+        package only the data files the stages of the pipeline depend on
+    prune_deps:  bool
+        package only the modules of the folder dependencies the notebooks
+        import
     """
 
-    sync_main_project(notebooks)
-    setup_package(notebooks, subfolder)
+    # The packaged notebooks are copies of the main project ones,
+    # so the same specs are used for the main project and the pipeline
+    specs = extract_notebooks(notebooks, static=static, jobs=jobs)
+    params_yml = f"{PIPELINES_FOLDER}/{subfolder}/params.yaml"
+
+    if not main:
+        # Build the main project files of the pipeline in memory only,
+        # they would be overwritten by the next pipeline synced
+        builder = pipeline_steps(notebooks, specs=specs, save=False)
+        dvc = {"stages": builder.get_dvc_stages()}
+
+        if force:
+            pathlib.Path(params_yml).unlink(missing_ok=True)
+
+        # The params of the pipeline are the ones the main project would get
+        if not pathlib.Path(params_yml).exists():
+            pathlib.Path(params_yml).parent.mkdir(parents=True, exist_ok=True)
+            if force or not pathlib.Path("params.yaml").exists():
+                dump_yaml(params_yml, builder.get_params())
+            else:
+                copy_file("params.yaml", params_yml)
+
+        setup_package(
+            notebooks,
+            subfolder,
+            specs,
+            runners,
+            dvc,
+            link_mode,
+            sparse,
+            prune_deps,
+        )
+        return
+
+    # The pipelines synced concurrently share the main project files, the
+    # package gets them as this pipeline wrote them
+    with PROJECT_LOCK:
+        # remove the params.yaml files if force is True
+        if force:
+            pathlib.Path("params.yaml").unlink(missing_ok=True)
+            pathlib.Path(params_yml).unlink(missing_ok=True)
+
+        sync_main_project(notebooks, specs, runners=runners)
+        dvc = load_yaml("dvc.yaml")
+
+        # The params of the pipeline are a copy of the main project ones
+        if not pathlib.Path(params_yml).exists():
+            pathlib.Path(params_yml).parent.mkdir(parents=True, exist_ok=True)
+            copy_file("params.yaml", params_yml)
 
+    setup_package(
+        notebooks,
+        subfolder,
+        specs,
+        runners,
+        dvc,
+        link_mode,
+        sparse,
+        prune_deps,
+    )
 
-def sync_pipeline(pipeline: str):
+
+def sync_pipeline(
+    pipeline: str,
+    static: bool = False,
+    jobs: int = 1,
+    runners: RunnersWorkflows | None = None,
+    force: bool = False,
+    main: bool = True,
+    link_mode: str = "copy",
+    sparse: bool = False,
+    prune_deps: bool = False,
+):
     """Sync the notebooks of the selected pipeline
     Parameters
     ----------
     pipeline:  str
         name of the pipeline
+    static:  bool
+        interpret the notebook's cells statically instead of executing them
+    jobs:  int
+        number of processes used to read the notebooks
+    runners:  RunnersWorkflows | None
+        runners workflows shared with the other pipelines, if any
+    force:  bool
+        forces creation of new params.yaml files
+    main:  bool
+        sync the main project too, otherwise its files are left untouched
+    link_mode:  str
+        how the data and dependencies are put in the package: copy,
+        hardlink, reflink or symlink
+    sparse:  bool
+        package only the data files the stages of the pipeline depend on
+    prune_deps:  bool
+        package only the modules of the folder dependencies the notebooks
+        import
     """
 
     print("Syncing pipeline", pipeline, "...")
 
-    # Get the notebooks from the pipelines.json file
-    pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-    if pathlib.Path(pipelines_path).exists():
-        with open(pipelines_path, "r") as pipelines_f:
-            pipelines = json.load(pipelines_f)
-            if pipeline not in pipelines:
-                print("Pipeline not found")
-                return
-            if not pipelines[pipeline]:
-                print("No notebooks found for this pipeline")
-                return
-            notebooks = get_notebooks_from_str(pipelines[pipeline])
-            if not notebooks:
-                print("No notebooks found for this pipeline")
-                return
-            # Package the pipeline project
-            sync_pipeline_project(notebooks, pipeline)
+    # Get the notebooks from the registry
+    registry = get_session()
+    if registry.exists():
+        notebooks = registry.notebooks(pipeline)
+        if notebooks is None:
+            print("Pipeline not found")
+            return
+        if not notebooks:
+            print("No notebooks found for this pipeline")
+            return
+        # Package the pipeline project, the other commands wait for the
+        # pipeline folder
+        with pipeline_lock(pipeline):
+            sync_pipeline_project(
+                notebooks,
+                pipeline,
+                static,
+                jobs,
+                runners,
+                force,
+                main,
+                link_mode,
+                sparse,
+                prune_deps,
+            )
     else:
         print("No pipelines found")
         return
@@ -75,6 +225,12 @@ def sync(
     pipeline: str | None,
     force: bool | None,
     all: bool | None,
+    static: bool | None = False,
+    jobs: int | None = 1,
+    runners: RunnersWorkflows | None = None,
+    link_mode: str | None = "copy",
+    sparse: bool | None = False,
+    prune_deps: bool | None = False,
 ):
     """Sync the notebooks with the pipeline project or the main project
 
@@ -83,8 +239,22 @@ def sync(
         (optional) pipeline (str | None): name of the pipeline
         (optional) force (bool | None): forces creation of a new params.yaml file
         (optional) all (bool | None): sync all the pipelines (default: False)
+        (optional) static (bool | None): interpret the notebook's cells statically instead of executing them (default: False)
+        (optional) jobs (int | None): number of processes used to read the notebooks, or to sync the pipelines with all (default: 1)
+        (optional) runners (RunnersWorkflows | None): runners workflows shared with the other pipelines (default: None)
+        (optional) link_mode (str | None): how the data and dependencies are put in the packages: copy, hardlink, reflink or symlink (default: copy)
+        (optional) sparse (bool | None): package only the data files the stages of the pipelines depend on (default: False)
+        (optional) prune_deps (bool | None): package only the modules of the folder dependencies the notebooks import (default: False)
     """
 
+    # The options not given on the command line are None
+    static = bool(static)
+    jobs = jobs or 1
+    link_mode = link_mode or "copy"
+    sparse = bool(sparse)
+    prune_deps = bool(prune_deps)
+    force = bool(force)
+
     # Sync all the pipelines
     if all:
         if force:
@@ -102,42 +272,100 @@ def sync(
                     # Use shutil.rmtree to delete the directory and its contents
                     shutil.rmtree(item_path)
 
-        # read the pipelines.json file and sync all the pipelines one by one
-        pipelines_path = f"{PIPELINES_FOLDER}/pipelines.json"
-        if pathlib.Path(pipelines_path).exists():
-            with open(pipelines_path, "r") as pipelines_f:
-                pipelines = json.load(pipelines_f)
-                for pipeline in pipelines:
-                    if pipeline != "default":
-                        sync(None, pipeline, True, False)
+        # read the registry and sync all the pipelines one by one
+        registry = get_session()
+        if registry.exists():
+            names = registry.pipelines()
+            default_pipeline = get_default_pipeline()
+
+            # Each sync overwrites the main project files, so they are only
+            # written by the pipeline synced last: the default pipeline or
+            # the last one, the others only compute what their package needs
+            final = (
+                names[-1] if names and default_pipeline not in names else None
+            )
+
+            # The runners workflows are written once all the pipelines are
+            # added, in the order of a serial sync
+            runners = RunnersWorkflows(names)
+            try:
+                # The pipelines don't share any file but the runners ones
+                with ThreadPoolExecutor(
+                    max_workers=max(min(jobs, len(names)), 1)
+                ) as executor:
+                    futures = [
+                        executor.submit(
+                            sync_pipeline,
+                            pipeline,
+                            static,
+                            # The notebooks are read by the pipelines workers
+                            1,
+                            runners,
+                            True,
+                            pipeline == final,
+                            link_mode,
+                            sparse,
+                            prune_deps,
+                        )
+                        for pipeline in names
+                    ]
+                    for future in futures:
+                        future.result()
 
                 # Sync the default pipeline last to avoid overwriting the params.yaml file
-                default_pipeline = get_default_pipeline()
                 if default_pipeline:
-                    sync(None, default_pipeline, True, False)
+                    sync_pipeline(
+                        default_pipeline,
+                        static,
+                        jobs,
+                        runners,
+                        True,
+                        link_mode=link_mode,
+                        sparse=sparse,
+                        prune_deps=prune_deps,
+                    )
+            finally:
+                # Keep the pipelines synced before a failure
+                runners.save()
         return
 
-    # remove the params.yaml file if force is True
-    if force:
-        pathlib.Path("params.yaml").unlink(missing_ok=True)
-        pathlib.Path(f"{PIPELINES_FOLDER}/{pipeline}/params.yaml").unlink(
-            missing_ok=True
-        )
-
     if pipeline:
-        sync_pipeline(pipeline)
-        return
-    if notebooks:
-        print("Syncing notebooks on main project", notebooks, "...")
-        list_notebooks = get_notebooks_from_str(notebooks)
-        sync_main_project(list_notebooks)
+        sync_pipeline(
+            pipeline,
+            static,
+            jobs,
+            runners,
+            force,
+            link_mode=link_mode,
+            sparse=sparse,
+            prune_deps=prune_deps,
+        )
         return
 
+    # The main project files are shared with the other commands, the lock is
+    # released before syncing the default pipeline which takes its own locks
+    with PROJECT_LOCK:
+        # remove the params.yaml file if force is True
+        if force:
+            pathlib.Path("params.yaml").unlink(missing_ok=True)
+        if notebooks:
+            print("Syncing notebooks on main project", notebooks, "...")
+            list_notebooks = get_notebooks_from_str(notebooks)
+            sync_main_project(list_notebooks, static=static, jobs=jobs)
+            return
+
     # If no notebooks and no pipeline, sync the default pipeline
     if not notebooks and not pipeline:
         default_pipeline = get_default_pipeline()
         if default_pipeline:
-            sync_pipeline(default_pipeline)
+            sync_pipeline(
+                default_pipeline,
+                static,
+                jobs,
+                link_mode=link_mode,
+                sparse=sparse,
+                prune_deps=prune_deps,
+            )
             return
 
     print("Please specify a pipeline name to sync or a list of notebooks")
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+import threading
+
+import yaml
+from yaml import SafeDumper
+
+# Parse with the libyaml bindings when pyyaml was built with them, the files
+# are still written with the python emitter: libyaml folds the long strings
+# differently and would rewrite all the generated workflows
+SafeLoader = yaml.CSafeLoader if yaml.__with_libyaml__ else yaml.SafeLoader
+
+# Parsed documents by path with the stat of the file they were parsed from
+_documents: dict[str, tuple] = {}
+_documents_lock = threading.Lock()
+
+
+def _copy(data):
+    """Copy a parsed document, only the dicts and lists are copied,
+    the scalars are immutable"""
+
+    if isinstance(data, dict):
+        return {key: _copy(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_copy(value) for value in data]
+    return data
+
+
+def load_yaml(path: str):
+    """Load a yaml file, the document is only parsed again when the file
+    changed and a copy is returned so it can be modified by the caller
+
+    Parameters
+    ----------
+    path: str
+        path of the yaml file
+    """
+
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    # The files are replaced when written, the inode changes with them
+    fingerprint = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    with _documents_lock:
+        cached = _documents.get(key)
+    if cached and cached[0] == fingerprint:
+        return _copy(cached[1])
+
+    with open(key, "r") as f:
+        data = yaml.load(f, Loader=SafeLoader)
+
+    with _documents_lock:
+        _documents[key] = (fingerprint, data)
+    return _copy(data)
+
+
+def dump_yaml_str(data, **kwargs) -> str:
+    """Serialize the data in yaml
+
+    Parameters
+    ----------
+    data: object
+        data to serialize
+    **kwargs:
+        options of yaml.dump
+    """
+
+    return yaml.dump(data, Dumper=SafeDumper, **kwargs)
@@ -34,6 +34,7 @@ setup(
         "tabulate",
         "dvc[s3]",
     ],
+    extras_require={"zst": ["zstandard"]},
     packages=find_packages(),
     entry_points={"console_scripts": "mlp = mlpipeline.cli:cli"},
     classifiers=[
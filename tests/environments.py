@@ -8,7 +8,14 @@ from typing import Tuple
 from click.testing import CliRunner
 
 from mlpipeline.cli import cli
-from mlpipeline.globals import PIPELINES_FOLDER
+from mlpipeline.globals import (
+    CACHE_FOLDER,
+    HASHES_FOLDER,
+    LOCKS_FOLDER,
+    MANIFESTS_FOLDER,
+    PIPELINES_FOLDER,
+    STATUS_FOLDER,
+)
 
 RESOURCES_FOLDER = "tests/resources"
 
@@ -88,6 +95,11 @@ def empty_environment():
             "data",
             "outputs",
             PIPELINES_FOLDER,
+            CACHE_FOLDER,
+            STATUS_FOLDER,
+            MANIFESTS_FOLDER,
+            LOCKS_FOLDER,
+            HASHES_FOLDER,
             ".github/workflows",
         ],
     )
@@ -138,6 +150,21 @@ def initialize_env(
     if pathlib.Path(PIPELINES_FOLDER).exists():
         shutil.rmtree(PIPELINES_FOLDER)
 
+    if pathlib.Path(CACHE_FOLDER).exists():
+        shutil.rmtree(CACHE_FOLDER)
+
+    if pathlib.Path(STATUS_FOLDER).exists():
+        shutil.rmtree(STATUS_FOLDER)
+
+    if pathlib.Path(MANIFESTS_FOLDER).exists():
+        shutil.rmtree(MANIFESTS_FOLDER)
+
+    if pathlib.Path(LOCKS_FOLDER).exists():
+        shutil.rmtree(LOCKS_FOLDER)
+
+    if pathlib.Path(HASHES_FOLDER).exists():
+        shutil.rmtree(HASHES_FOLDER)
+
     # remove any file that has as prefix the name of the pipeline in .github/workflows folder
     if pathlib.Path(".github/workflows").exists():
         for file in os.listdir(".github/workflows"):
@@ -50,7 +50,7 @@ def test_create_new_pipeline_with_notebook_links():
 
     assert pathlib.Path("pipelines").exists()
     assert pathlib.Path("pipelines/myfirstpipeline").exists()
-    assert pathlib.Path("pipelines/pipelines.json").exists()
+    assert pathlib.Path("pipelines/pipelines.db").exists()
 
     assert pathlib.Path("notebooks").exists()
     assert pathlib.Path("notebooks/data_preprocess.ipynb").exists()
@@ -1,8 +1,16 @@
 import os
+import pathlib
 
 from click.testing import CliRunner
 
 from mlpipeline.cli import cli
+from mlpipeline.delete import delete
+from mlpipeline.registry import (
+    REGISTRY_PATH,
+    PipelineRegistry,
+    get_session,
+    registry_session,
+)
 
 from .environments import initializedEnv, notLinkedPipelineEnv
 from .globals import EXIT_CODE_CLICK_ERROR, EXIT_CODE_FAILED, EXIT_CODE_SUCCESS
@@ -94,3 +102,35 @@ def test_delete_all_with_3_existing_pipelines():
     assert "Pipeline mysecondpipeline deleted" in result.output
     assert "Pipeline mythirdpipeline deleted" in result.output
     assert "All pipelines deleted" in result.output
+
+
+@notLinkedPipelineEnv(
+    {
+        "missing_folders": [],
+        "missing_files": [],
+    },
+    "myfirstpipeline",
+    "mysecondpipeline",
+    "mythirdpipeline",
+)
+def test_delete_all_writes_the_registry_once():
+    """Test that the pipelines deleted by a command are removed from the
+    registry once the command ends"""
+
+    registry = PipelineRegistry()
+    with registry_session():
+        delete("myfirstpipeline", False)
+
+        # The registry is read from memory until the end of the command
+        assert registry.load()[0] == {
+            "myfirstpipeline": [],
+            "mysecondpipeline": [],
+            "mythirdpipeline": [],
+        }
+        assert not get_session().has_pipeline("myfirstpipeline")
+
+        delete(None, True)
+
+        assert pathlib.Path(REGISTRY_PATH).exists()
+
+    assert not pathlib.Path(REGISTRY_PATH).exists()
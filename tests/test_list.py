@@ -1,6 +1,11 @@
+import json
+import os
+import pathlib
+
 from click.testing import CliRunner
 
 from mlpipeline.cli import cli
+from mlpipeline.globals import PIPELINES_FOLDER
 
 from .environments import initializedEnv, notLinkedPipelineEnv
 from .globals import EXIT_CODE_SUCCESS
@@ -23,6 +28,46 @@ def test_list_init_env():
     assert "No pipelines found" in result.output
 
 
+@initializedEnv
+def test_list_migrates_the_json_registry():
+    """Test the list command on the pipelines.json file of the previous
+    versions, the pipelines are migrated to the sqlite registry"""
+
+    os.makedirs(f"{PIPELINES_FOLDER}/myfirstpipeline")
+    os.makedirs(f"{PIPELINES_FOLDER}/mysecondpipeline")
+    with open(f"{PIPELINES_FOLDER}/pipelines.json", "w") as pipelines_f:
+        json.dump(
+            {
+                "myfirstpipeline": "[notebooks/data_preprocess.ipynb,notebooks/train.ipynb]",
+                "mysecondpipeline": "",
+                "default": "myfirstpipeline",
+            },
+            pipelines_f,
+        )
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["list"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (
+        "[Default] Pipeline: myfirstpipeline, notebooks: [notebooks/data_preprocess.ipynb, notebooks/train.ipynb]"
+        in result.output
+    )
+    assert "Pipeline: mysecondpipeline, notebooks: \n" in result.output
+    assert pathlib.Path(f"{PIPELINES_FOLDER}/pipelines.db").exists()
+    assert not pathlib.Path(f"{PIPELINES_FOLDER}/pipelines.json").exists()
+
+    # The migrated registry is updated like a new one
+    result = runner.invoke(cli, ["delete", "-p", "myfirstpipeline"])
+
+    assert "Default pipeline removed" in result.output
+
+    result = runner.invoke(cli, ["list"])
+
+    assert "myfirstpipeline" not in result.output
+    assert "Pipeline: mysecondpipeline" in result.output
+
+
 # ----------------------------- Pipeline Created ----------------------------- #
 
 
@@ -0,0 +1,119 @@
+import pathlib
+import tarfile
+import time
+
+from click.testing import CliRunner
+
+from mlpipeline.cli import cli
+from mlpipeline.globals import PIPELINES_FOLDER
+
+from .environments import initializedEnv, pipelineLinkedEnv
+from .globals import EXIT_CODE_CLICK_ERROR, EXIT_CODE_SUCCESS
+
+# ---------------------------------------------------------------------------- #
+#                          Test on the package command                         #
+# ---------------------------------------------------------------------------- #
+
+# ----------------------------- Initialized Environment ---------------------------- #
+
+
+@initializedEnv
+def test_package_missing_argument():
+    """Test the package command without the archive argument"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["package", "-p", "myfirstpipeline"])
+
+    assert result.exit_code == EXIT_CODE_CLICK_ERROR
+
+
+@initializedEnv
+def test_package_on_unexisting_pipeline():
+    """Test the package command on a pipeline that doesn't exist"""
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["package", "-p", "notapipeline", "-a", "notapipeline.tar"]
+    )
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "No pipelines found" in result.output
+    assert not pathlib.Path("notapipeline.tar").exists()
+
+
+# ----------------------------- Pipeline Created ----------------------------- #
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_package_on_created_pipeline():
+    """Test that the package command archives the files of the synced
+    pipeline folder
+    """
+
+    archive = pathlib.Path("myfirstpipeline.tar.gz")
+    runner = CliRunner()
+    try:
+        result = runner.invoke(
+            cli, ["package", "-p", "myfirstpipeline", "-a", str(archive)]
+        )
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+        assert "Pipeline myfirstpipeline packaged" in result.output
+
+        package = pathlib.Path(PIPELINES_FOLDER)
+        with tarfile.open(archive, "r:gz") as tar:
+            names = tar.getnames()
+            for name in [
+                "myfirstpipeline/dvc.yaml",
+                "myfirstpipeline/params.yaml",
+                "myfirstpipeline/notebooks/train.ipynb",
+                "myfirstpipeline/.github/workflows/myfirstpipeline.yaml",
+                "myfirstpipeline/.dvc/config",
+            ]:
+                assert name in names
+                # The same files as the synced pipeline
+                assert (
+                    tar.extractfile(name).read()
+                    == (package / name).read_bytes()
+                )
+
+        # The same files give the same archive, even packaged later
+        content = archive.read_bytes()
+        time.sleep(1)
+        result = runner.invoke(
+            cli, ["package", "-p", "myfirstpipeline", "-a", str(archive)]
+        )
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+        assert archive.read_bytes() == content
+
+        result = runner.invoke(
+            cli, ["package", "-p", "myfirstpipeline", "-a", "archive.zip"]
+        )
+
+        assert "Unknown archive extension" in result.output
+
+        result = runner.invoke(
+            cli,
+            [
+                "package",
+                "-p",
+                "myfirstpipeline",
+                "-a",
+                str(archive),
+                "--level",
+                "30",
+            ],
+        )
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+        assert "The level of the gz codec must be between 1 and 9" in (
+            result.output
+        )
+        assert archive.read_bytes() == content
+    finally:
+        archive.unlink(missing_ok=True)
@@ -1,15 +1,21 @@
+import hashlib
 import os
+import pathlib
+import tempfile
 
 from click.testing import CliRunner
 
+from mlpipeline.artifacts import dump_yaml
 from mlpipeline.cli import cli
+from mlpipeline.globals import PIPELINES_FOLDER
+from mlpipeline.yamlio import load_yaml
 
 from .environments import (
     initializedEnv,
     notLinkedPipelineEnv,
     pipelineLinkedEnv,
 )
-from .globals import EXIT_CODE_SUCCESS
+from .globals import EXIT_CODE_CLICK_ERROR, EXIT_CODE_SUCCESS
 
 # ---------------------------------------------------------------------------- #
 #                          Test on the run_local command                          #
@@ -53,6 +59,121 @@ def test_run_with_1_linked_pipeline():
     assert "Pipeline myfirstpipeline ran successfully" in result.output
 
 
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_run_with_1_linked_pipeline_pulls_the_data_in_one_process():
+    """Test the run command pulling the imported data files of the pipeline
+    with several jobs, each file and the whole pull are reported"""
+
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["run_local", "-p", "myfirstpipeline", "-j", "0"]
+    )
+
+    assert result.exit_code == EXIT_CODE_CLICK_ERROR
+
+    result = runner.invoke(
+        cli, ["run_local", "-p", "myfirstpipeline", "-j", "2"]
+    )
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (
+        "Pulling s3://sw-data-mlops-internship/train_data_cleaning.csv to data/train_data_cleaning.csv"
+        in result.output
+    )
+    # Without credentials the file fails to be pulled and the run goes on
+    assert "files pulled (" in result.output
+    assert "Pipeline myfirstpipeline ran successfully" in result.output
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_run_with_1_linked_pipeline_skips_the_data_up_to_date():
+    """Test that the run command doesn't import again the data files matching
+    the md5 of their .dvc file"""
+
+    # A data file imported from a local file, up to date
+    content = b"id,text\n1,hello\n"
+    pathlib.Path("data/local.csv").write_bytes(content)
+    dump_yaml(
+        "data/local.csv.dvc",
+        {
+            "frozen": True,
+            "deps": [{"path": os.path.abspath("tests/resources/local.csv")}],
+            "outs": [
+                {
+                    "md5": hashlib.md5(content).hexdigest(),
+                    "size": len(content),
+                    "hash": "md5",
+                    "path": "local.csv",
+                }
+            ],
+        },
+    )
+
+    runner = CliRunner()
+    try:
+        result = runner.invoke(cli, ["run_local", "-p", "myfirstpipeline"])
+    finally:
+        pathlib.Path("data/local.csv").unlink(missing_ok=True)
+        pathlib.Path("data/local.csv.dvc").unlink(missing_ok=True)
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Up to date: data/local.csv" in result.output
+    assert "Pulling s3://sw-data-mlops-internship" in result.output
+    assert "1 files up to date" in result.output
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_run_with_1_linked_pipeline_pulls_several_imports_concurrently():
+    """Test that the run command imports several data files at the same time
+    and writes the md5 of each of them in its .dvc file"""
+
+    runner = CliRunner()
+    names = [f"local{i}.csv" for i in range(6)]
+    with tempfile.TemporaryDirectory() as source:
+        # Data files imported from local files, never pulled yet
+        for i, name in enumerate(names):
+            pathlib.Path(source, name).write_text(f"id,text\n{i},hello\n")
+            dump_yaml(
+                f"data/{name}.dvc",
+                {
+                    "frozen": True,
+                    "deps": [{"path": os.path.join(source, name)}],
+                    "outs": [{"path": name}],
+                },
+            )
+
+        try:
+            result = runner.invoke(
+                cli, ["run_local", "-p", "myfirstpipeline", "-j", "4"]
+            )
+        finally:
+            for name in names:
+                pathlib.Path(f"data/{name}.dvc").unlink(missing_ok=True)
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+        assert "6 files pulled (" in result.output
+
+        data = pathlib.Path(PIPELINES_FOLDER, "myfirstpipeline", "data")
+        for name in names:
+            content = pathlib.Path(source, name).read_bytes()
+            assert (data / name).read_bytes() == content
+            out = load_yaml(str(data / f"{name}.dvc"))["outs"][0]
+            assert out["md5"] == hashlib.md5(content).hexdigest()
+
+
 @notLinkedPipelineEnv(
     {
         "missing_folders": [],
@@ -78,3 +78,55 @@ def test_show_with_1_linked_pipeline_and_3_notebooks():
     assert "data_preprocess" in result.output
     assert "train" in result.output
     assert "upload_to_s3" in result.output
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb, notebooks/upload_to_s3.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_show_with_target_stage():
+    """Test the show command on a stage, only the stage and the stages it
+    depends on are shown"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["show", "--target", "data_preprocess"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+
+    assert "data/train_data_cleaning.csv" in result.output
+    assert "data_preprocess" in result.output
+    assert not "train |" in result.output
+    assert not "upload_to_s3" in result.output
+
+    result = runner.invoke(cli, ["show", "--target", "not_a_stage"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Stage not_a_stage not found" in result.output
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_show_with_mermaid_and_dot_formats():
+    """Test the show command with the mermaid and dot formats"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["show", "--format", "mermaid"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert result.output.splitlines() == [
+        "flowchart TD",
+        '\tnode1["data/train_data_cleaning.csv.dvc"]',
+        '\tnode2["data_preprocess"]',
+        '\tnode3["train"]',
+        "\tnode1-->node2",
+        "\tnode2-->node3",
+    ]
+
+    result = runner.invoke(cli, ["show", "--format", "dot"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert '"data_preprocess" -> "train";' in result.output
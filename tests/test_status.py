@@ -0,0 +1,117 @@
+import nbformat
+from click.testing import CliRunner
+
+from mlpipeline.cli import cli
+from mlpipeline.status import record_status
+
+from .environments import emptyEnv, initializedEnv, pipelineLinkedEnv
+from .globals import EXIT_CODE_SUCCESS
+
+# ---------------------------------------------------------------------------- #
+#                          Test on the status command                          #
+# ---------------------------------------------------------------------------- #
+
+# ----------------------------- Empty Environment ---------------------------- #
+
+
+@emptyEnv
+def test_status_on_empty_env():
+    """Test the status command in an empty environment"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["status"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert not "data_preprocess" in result.output
+
+
+# ----------------------------- Initialized Environment ---------------------------- #
+
+
+@initializedEnv
+def test_status_never_run():
+    """Test the status command on stages that were never run"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["status"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "data_preprocess: never run" in result.output
+    assert "train: never run" in result.output
+
+
+@initializedEnv
+def test_status_after_changes():
+    """Test the status command after changing the notebook of a stage and
+    a param, the stages downstream of a changed stage are stale too"""
+
+    record_status()
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["status"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "All stages are up to date" in result.output
+
+    # Changing the outputs of a notebook doesn't change its stage
+    nb = nbformat.read("notebooks/data_preprocess.ipynb", as_version=4)
+    for cell in nb.cells:
+        if cell.cell_type == "code":
+            cell.outputs = []
+    nbformat.write(nb, "notebooks/data_preprocess.ipynb")
+
+    result = runner.invoke(cli, ["status"])
+
+    assert "All stages are up to date" in result.output
+
+    # Changing the source of a notebook makes its stage stale
+    nb.cells.append(nbformat.v4.new_code_cell("print('new cell')"))
+    nbformat.write(nb, "notebooks/data_preprocess.ipynb")
+
+    result = runner.invoke(cli, ["status"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "data_preprocess: notebook changed" in result.output
+    assert "train: downstream of data_preprocess" in result.output
+
+    record_status()
+    result = runner.invoke(cli, ["status"])
+
+    assert "All stages are up to date" in result.output
+
+    # Changing the params linked to a stage makes it stale
+    with open("notebooks/params.yaml", "a") as params_f:
+        params_f.write("  NEW_PARAM: 1\n")
+
+    result = runner.invoke(cli, ["status"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "train: params changed" in result.output
+    assert not "data_preprocess" in result.output
+
+
+# ----------------------------- Pipeline Created ----------------------------- #
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_status_on_pipeline():
+    """Test the status command on a pipeline"""
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["status", "-p", "myfirstpipeline"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "data_preprocess: never run" in result.output
+
+    record_status("myfirstpipeline")
+    result = runner.invoke(cli, ["status", "-p", "myfirstpipeline"])
+
+    assert "All stages are up to date" in result.output
+
+    result = runner.invoke(cli, ["status", "-p", "notapipeline"])
+
+    assert "Pipeline notapipeline not found" in result.output
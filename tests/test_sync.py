@@ -1,8 +1,15 @@
 import pathlib
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from click.testing import CliRunner
 
 from mlpipeline.cli import cli
+from mlpipeline.globals import CACHE_FOLDER, PIPELINES_FOLDER
+from mlpipeline.packagebuilder import setup_package
+from mlpipeline.utils import get_notebooks_from_str
 
 from .environments import (
     initializedEnv,
@@ -117,6 +124,77 @@ def test_sync_on_existing_notebooks():
     assert pathlib.Path("notebooks/train.ipynb").exists()
 
 
+@initializedEnv
+def test_sync_on_existing_notebooks_twice():
+    """Test the sync command twice on the same notebooks, the second sync
+    uses the notebooks cache and doesn't rewrite the dvc.yaml file"""
+
+    runner = CliRunner()
+    args = [
+        "sync",
+        "-n",
+        "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ]
+    result = runner.invoke(cli, args)
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert len(list(pathlib.Path(CACHE_FOLDER).glob("*.json"))) == 2
+
+    assert "Updated dvc.yaml" in result.output
+
+    dvc_yaml = pathlib.Path("dvc.yaml").read_text()
+    dvc_yaml_mtime = pathlib.Path("dvc.yaml").stat().st_mtime_ns
+    result = runner.invoke(cli, args)
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Pipeline saved successfully" in result.output
+    assert pathlib.Path("dvc.yaml").read_text() == dvc_yaml
+
+    # The unchanged files are not rewritten
+    assert "Updated dvc.yaml" not in result.output
+    assert pathlib.Path("dvc.yaml").stat().st_mtime_ns == dvc_yaml_mtime
+
+
+@initializedEnv
+def test_sync_on_existing_notebooks_static():
+    """Test the sync command with the static flag, the notebook's cells are
+    not executed and the dvc.yaml file is the same as with the executed cells
+    """
+
+    runner = CliRunner()
+    notebooks = "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]"
+    result = runner.invoke(cli, ["sync", "-n", notebooks])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+
+    dvc_yaml = pathlib.Path("dvc.yaml").read_text()
+    result = runner.invoke(cli, ["sync", "-s", "-n", notebooks])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Pipeline saved successfully" in result.output
+    assert pathlib.Path("dvc.yaml").read_text() == dvc_yaml
+
+
+@initializedEnv
+def test_sync_on_existing_notebooks_parallel():
+    """Test the sync command reading the notebooks with several processes,
+    the dvc.yaml file is the same as the one of a serial sync"""
+
+    runner = CliRunner()
+    notebooks = "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb, notebooks/upload_to_s3.ipynb]"
+    result = runner.invoke(cli, ["sync", "-j", "3", "-n", notebooks])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Pipeline saved successfully" in result.output
+
+    dvc_yaml = pathlib.Path("dvc.yaml").read_text()
+    shutil.rmtree(CACHE_FOLDER)
+    result = runner.invoke(cli, ["sync", "-n", notebooks])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert pathlib.Path("dvc.yaml").read_text() == dvc_yaml
+
+
 # ----------------------------- Pipeline Created ----------------------------- #
 
 
@@ -154,6 +232,264 @@ def test_sync_on_created_pipeline_with_linked_notebooks():
     assert "Pipeline saved successfully" in result.output
 
 
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_copies_only_changed_files():
+    """Test that syncing a pipeline again only copies the changed files
+    and removes the files that are not part of the package anymore
+    """
+
+    # The pipeline was already synced by the environment
+    package = pathlib.Path(PIPELINES_FOLDER, "myfirstpipeline")
+    notebook = package / "notebooks" / "train.ipynb"
+    mtime = notebook.stat().st_mtime_ns
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "0 files copied" in result.output
+    assert notebook.stat().st_mtime_ns == mtime
+
+    # A new data file is copied, and removed once it is deleted
+    pathlib.Path("data/extra.txt").write_text("extra")
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert "1 files copied" in result.output
+    assert "files/s" in result.output
+    assert (package / "data" / "extra.txt").read_text() == "extra"
+
+    pathlib.Path("data/extra.txt").unlink()
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert "1 files removed" in result.output
+    assert not (package / "data" / "extra.txt").exists()
+
+    # A modified copy in the package is restored
+    notebook.write_text("{}")
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert "1 files copied" in result.output
+    assert notebook.read_text() != "{}"
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_with_link_mode():
+    """Test the sync command linking the data and dependencies of the
+    pipeline instead of copying them
+    """
+
+    package = pathlib.Path(PIPELINES_FOLDER, "myfirstpipeline")
+    data_file = "data/train_data_cleaning.csv"
+    dvc_file = "data/train_data_cleaning.csv.dvc"
+    pathlib.Path(data_file).write_text("id,text\n")
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["sync", "-p", "myfirstpipeline", "-l", "hardlink"]
+    )
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (package / data_file).samefile(data_file)
+    # The files dvc rewrites in place are still copied
+    assert not (package / dvc_file).samefile(dvc_file)
+    # The notebooks are still copied
+    assert not (package / "notebooks" / "train.ipynb").samefile(
+        "notebooks/train.ipynb"
+    )
+
+    result = runner.invoke(
+        cli, ["sync", "-p", "myfirstpipeline", "-l", "symlink"]
+    )
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (package / data_file).is_symlink()
+    assert not (package / dvc_file).is_symlink()
+    assert (package / data_file).read_text() == pathlib.Path(
+        data_file
+    ).read_text()
+
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert not (package / data_file).is_symlink()
+    assert not (package / data_file).samefile(data_file)
+
+    result = runner.invoke(
+        cli, ["sync", "-p", "myfirstpipeline", "-l", "notamode"]
+    )
+
+    assert result.exit_code == EXIT_CODE_CLICK_ERROR
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_shares_the_dvc_cache():
+    """Test that the sync command doesn't copy the dvc cache in the
+    pipeline and configures it to use the cache of the main project
+    """
+
+    cached_file = pathlib.Path(".dvc/cache/files/md5/00/cached")
+    cached_file.parent.mkdir(parents=True, exist_ok=True)
+    cached_file.write_text("cached")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    dvc_folder = pathlib.Path(PIPELINES_FOLDER, "myfirstpipeline", ".dvc")
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert not (dvc_folder / "cache").exists()
+    assert (dvc_folder / ".gitignore").exists()
+    assert "dir = ../../../.dvc/cache" in (dvc_folder / "config").read_text()
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_sparse():
+    """Test the sync command packaging only the data files the stages of
+    the pipeline depend on
+    """
+
+    package = pathlib.Path(PIPELINES_FOLDER, "myfirstpipeline")
+    pathlib.Path("data/unrelated.txt").write_text("unrelated")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (package / "data" / "unrelated.txt").exists()
+
+    result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline", "--sparse"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert not (package / "data" / "unrelated.txt").exists()
+    assert (package / "data" / "train_data_cleaning.csv.dvc").exists()
+    assert (package / "data" / ".gitignore").exists()
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_waits_for_the_other_commands():
+    """Test that the sync of a pipeline waits for another command holding the
+    lock of the pipeline folder and reports the wait"""
+
+    # Another mlp command holds the lock of the pipeline folder for a second
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import time\n"
+            "from mlpipeline.locks import pipeline_lock\n"
+            "with pipeline_lock('myfirstpipeline'):\n"
+            "    print('locked', flush=True)\n"
+            "    time.sleep(1)\n",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+
+        runner = CliRunner()
+        result = runner.invoke(cli, ["sync", "-p", "myfirstpipeline"])
+    finally:
+        holder.wait()
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (
+        "Waiting for the pipeline-myfirstpipeline lock held by another command"
+        in result.output
+    )
+    assert "Lock pipeline-myfirstpipeline acquired after" in result.output
+    assert "Pipeline myfirstpipeline synced" in result.output
+
+
+@initializedEnv
+def test_sync_notebooks_waits_for_the_other_commands():
+    """Test that the sync of notebooks on the main project waits for another
+    command holding the lock of the main project files"""
+
+    # Another mlp command holds the lock of the main project for a second
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import time\n"
+            "from mlpipeline.locks import get_lock\n"
+            "with get_lock('project'):\n"
+            "    print('locked', flush=True)\n"
+            "    time.sleep(1)\n",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+
+        runner = CliRunner()
+        result = runner.invoke(
+            cli,
+            [
+                "sync",
+                "-n",
+                "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+                "-f",
+            ],
+        )
+    finally:
+        holder.wait()
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert (
+        "Waiting for the project lock held by another command" in result.output
+    )
+    assert "Lock project acquired after" in result.output
+    # The params.yaml file is only removed once the lock is acquired
+    assert result.output.index("Lock project acquired after") < (
+        result.output.index("Syncing notebooks on main project")
+    )
+
+
+@pipelineLinkedEnv(
+    "myfirstpipeline",
+    "[notebooks/train.ipynb]",
+    ["train_data_cleaning.csv.dvc"],
+)
+def test_sync_on_created_pipeline_prune_deps():
+    """Test the sync command packaging only the modules of the utils
+    folder the notebooks import
+    """
+
+    utils = pathlib.Path(
+        PIPELINES_FOLDER, "myfirstpipeline", "notebooks", "utils"
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["sync", "-p", "myfirstpipeline", "--prune-deps"]
+    )
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    assert "Pruned dependency: ./notebooks/utils" in result.output
+    assert (utils / "plot_target.py").exists()
+    assert not (utils / "clean_text.py").exists()
+    assert not (utils / "counter_word.py").exists()
+
+
 @notLinkedPipelineEnv(
     {
         "missing_folders": [".dvc"],
@@ -282,3 +618,144 @@ def test_sync_on_created_pipeline_manually_linked_notebooks_with_missing_files()
         str(result.exception)
         == "No requirements.txt or setup_env folder found"
     )
+
+
+@notLinkedPipelineEnv(
+    {
+        "missing_folders": [],
+        "missing_files": [],
+    },
+    "myfirstpipeline",
+    "mysecondpipeline",
+)
+def test_sync_pipelines_concurrently():
+    """Test packaging two pipelines concurrently in the same process,
+    the files are the same as the ones of a serial sync"""
+
+    def read_files():
+        return {
+            path: path.read_bytes()
+            for folder in [PIPELINES_FOLDER, ".github/workflows"]
+            for path in pathlib.Path(folder).rglob("*")
+            # dvc writes its own temporary files in .dvc/tmp
+            if path.is_file() and ".dvc/tmp" not in path.as_posix()
+        }
+
+    runner = CliRunner()
+    notebooks = {
+        "myfirstpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+        "mysecondpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb, notebooks/upload_to_s3.ipynb]",
+    }
+    for pipeline in notebooks:
+        runner.invoke(cli, ["link", "-p", pipeline, "-n", notebooks[pipeline]])
+        result = runner.invoke(cli, ["sync", "-p", pipeline])
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+
+    files = read_files()
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                setup_package,
+                get_notebooks_from_str(notebooks[pipeline]),
+                pipeline,
+            )
+            for pipeline in notebooks
+        ]
+        for future in futures:
+            future.result()
+
+    assert read_files() == files
+
+
+@notLinkedPipelineEnv(
+    {
+        "missing_folders": [],
+        "missing_files": [],
+    },
+    "myfirstpipeline",
+    "mysecondpipeline",
+)
+def test_sync_all_writes_the_runners_once():
+    """Test the sync command on all the pipelines, the runners workflows are
+    written once and are the same as the ones of the pipelines synced one by
+    one"""
+
+    def read_workflows():
+        return {
+            path: path.read_bytes()
+            for path in pathlib.Path(".github/workflows").glob("*.yaml")
+            if path.stem in ["matrix_runner", "single_runner", "main"]
+            or path.stem in notebooks
+        }
+
+    runner = CliRunner()
+    notebooks = {
+        "myfirstpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+        "mysecondpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb, notebooks/upload_to_s3.ipynb]",
+    }
+    for pipeline in notebooks:
+        runner.invoke(cli, ["link", "-p", pipeline, "-n", notebooks[pipeline]])
+        result = runner.invoke(cli, ["sync", "-p", pipeline])
+
+        assert result.exit_code == EXIT_CODE_SUCCESS
+
+    workflows = read_workflows()
+    for path in workflows:
+        path.unlink()
+
+    result = runner.invoke(cli, ["sync", "-a"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    # The main project is only synced with the default pipeline
+    assert result.output.count("Main Project synced") == 1
+    assert result.output.count("matrix_runner.yaml") == 1
+    assert result.output.count("single_runner.yaml") == 1
+    assert read_workflows() == workflows
+
+
+@notLinkedPipelineEnv(
+    {
+        "missing_folders": [],
+        "missing_files": [],
+    },
+    "myfirstpipeline",
+    "mysecondpipeline",
+    "mythirdpipeline",
+)
+def test_sync_all_pipelines_concurrently():
+    """Test the sync command on all the pipelines with several workers,
+    the files are the same as the ones of a serial sync"""
+
+    def read_files():
+        return {
+            path: path.read_bytes()
+            for folder in [PIPELINES_FOLDER, ".github/workflows", "notebooks"]
+            for path in pathlib.Path(folder).rglob("*")
+            # dvc writes its own temporary files in .dvc/tmp
+            if path.is_file() and ".dvc/tmp" not in path.as_posix()
+        } | {
+            path: path.read_bytes()
+            for path in [pathlib.Path("dvc.yaml"), pathlib.Path("params.yaml")]
+        }
+
+    runner = CliRunner()
+    notebooks = {
+        "myfirstpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb]",
+        "mysecondpipeline": "[notebooks/data_preprocess.ipynb, notebooks/train.ipynb, notebooks/upload_to_s3.ipynb]",
+        "mythirdpipeline": "[notebooks/data_preprocess.ipynb]",
+    }
+    for pipeline in notebooks:
+        runner.invoke(cli, ["link", "-p", pipeline, "-n", notebooks[pipeline]])
+
+    result = runner.invoke(cli, ["sync", "-a"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+
+    files = read_files()
+    result = runner.invoke(cli, ["sync", "-a", "-j", "3"])
+
+    assert result.exit_code == EXIT_CODE_SUCCESS
+    for pipeline in notebooks:
+        assert f"Pipeline {pipeline} synced" in result.output
+    assert read_files() == files